@@ -1,6 +1,6 @@
 from fastapi import APIRouter, UploadFile, File, Depends, HTTPException, Form
 from sqlalchemy.ext.asyncio import AsyncSession
-from app.core.db import get_db
+from app.core.db import get_ingest_db
 from app.services.ingestion import ingest_file
 from app.schemas.document import IngestResponse
 import logging
@@ -14,7 +14,7 @@ router = APIRouter(prefix="/ingest", tags=["ingestion"])
 async def ingest_document(
     doc_id: str = Form(...),
     file: UploadFile = File(...),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_ingest_db)
 ):
     """
     Upload and ingest a document:
@@ -64,7 +64,7 @@ async def ingest_document(
 
 @router.post("/ingest-from-folder")
 async def ingest_from_source_folder(
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_ingest_db)
 ):
     """
     Batch ingest all documents from the data/source folder.
@@ -1,9 +1,12 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Response
 from sqlalchemy.ext.asyncio import AsyncSession
-from app.core.db import get_db
+from app.core.db import get_read_db
 from app.services.rag import answer_question
 from app.schemas.document import QueryRequest, QueryResponse
+from app.core.metrics import start_stage_timings, format_server_timing
+from app.services.query_log import record_query
 import logging
+import time
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/query", tags=["query"])
@@ -11,14 +14,21 @@ router = APIRouter(prefix="/query", tags=["query"])
 @router.post("", response_model=QueryResponse)
 async def query_rag(
     request: QueryRequest,
-    db: AsyncSession = Depends(get_db)
+    response: Response,
+    db: AsyncSession = Depends(get_read_db)
 ):
     """
     Query the RAG system:
     - Embeds the question
     - Retrieves relevant chunks from pgvector
     - Generates answer with Gemini
+
+    Per-stage durations are returned in the Server-Timing header.
     """
+    timings = start_stage_timings()
+    started_at = time.perf_counter()
+    sources = []
+    status = "error"
     try:
         if not request.question.strip():
             raise HTTPException(status_code=400, detail="Question cannot be empty")
@@ -26,9 +36,17 @@ async def query_rag(
         answer, sources = await answer_question(
             db=db,
             question=request.question,
-            top_k=request.top_k or 10  # Increased default for better accuracy
+            top_k=request.top_k or 10,  # Increased default for better accuracy
+            doc_ids=request.doc_ids,
+            metadata_filter=request.metadata_filter,
+            similarity_threshold=request.similarity_threshold,
+            retrieval_mode=request.retrieval_mode,
+            vector_weight=request.vector_weight,
+            text_weight=request.text_weight
         )
 
+        status = "ok"
+        response.headers["Server-Timing"] = format_server_timing(timings)
         return QueryResponse(
             answer=answer,
             sources=sources
@@ -37,3 +55,13 @@ async def query_rag(
     except Exception as e:
         logger.error(f"Query error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
+
+    finally:
+        record_query(
+            request.question,
+            request.model_dump(exclude={"question"}),
+            [[source.doc_id, source.chunk_id] for source in sources],
+            timings,
+            time.perf_counter() - started_at,
+            status
+        )
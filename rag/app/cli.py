@@ -0,0 +1,202 @@
+"""
+Admin commands.
+
+    python -m app.cli rechunk [--concurrency 4] [--doc-id ID ...] [--chunk-size N --chunk-overlap N]
+    python -m app.cli reembed start --model MODEL [--dimensions N]
+    python -m app.cli reembed status
+    python -m app.cli reembed cancel
+    python -m app.cli snapshot export DIR
+    python -m app.cli snapshot import DIR [--replace]
+"""
+from sqlalchemy import select
+from pathlib import Path
+from typing import List, Optional
+from app.core.config import settings
+from app.core.db import IngestSessionLocal, dispose_engines
+from app.models.document import CatalogDocument
+from app.services import embedding_migration, embeddings, ingestion, parse_cache, snapshot
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import sys
+import time
+
+logger = logging.getLogger(__name__)
+
+def find_original(doc: CatalogDocument) -> Optional[Path]:
+    """The file a catalog row was ingested from, if it is still on disk with the same content."""
+    candidates = [settings.source_dir / doc.filename]
+    # Uploads are saved as {timestamp}_{doc_id}_{filename}
+    candidates += sorted(settings.upload_dir.glob(f"*_{doc.doc_id}_{doc.filename}"), reverse=True)
+    for path in candidates:
+        if path.is_file() and hashlib.sha256(path.read_bytes()).hexdigest() == doc.file_hash:
+            return path
+    return None
+
+def load_cached_text(doc: CatalogDocument):
+    """Parsed documents for a catalog row: from the parse cache, else by re-parsing the original."""
+    ext = Path(doc.filename).suffix.lower()
+    loader_path = ingestion.LOADER_MAPPING.get(ext)
+    if not loader_path or not doc.file_hash:
+        return None
+    documents = parse_cache.get(doc.file_hash, loader_path)
+    if documents:
+        return documents
+    path = find_original(doc)
+    if path is None:
+        return None
+    logger.info(f"Parse cache miss for {doc.filename}, re-parsing {path}")
+    return ingestion.load_documents(str(path), ext, doc.file_hash)
+
+async def rechunk_document(doc: CatalogDocument, semaphore: asyncio.Semaphore) -> Optional[int]:
+    if not doc.filename:
+        # Catalogued before filenames were recorded; the next startup
+        # reconciliation re-ingests it from source and fills it in
+        logger.warning(f"⚠️  Skipping {doc.doc_id}: no filename recorded")
+        return None
+    async with semaphore:
+        started_at = time.perf_counter()
+        documents = await asyncio.to_thread(load_cached_text, doc)
+        if not documents:
+            logger.warning(f"⚠️  Skipping {doc.doc_id} ({doc.filename}): no cached text or original file")
+            return None
+        chunk_texts = await asyncio.to_thread(ingestion.split_documents, documents)
+        async with IngestSessionLocal() as db:
+            model, dimensions = await embedding_migration.get_active_embedding_model(db)
+            await db.commit()  # Don't sit idle in a transaction while embedding
+            vectors = await ingestion.embed_chunks(chunk_texts, model, dimensions)
+            count = await ingestion.store_chunks(
+                db, doc.doc_id, doc.filename, chunk_texts, vectors,
+                file_hash=doc.file_hash,
+                size_bytes=doc.size_bytes,
+                started_at=started_at,
+                embedding_model=model
+            )
+        logger.info(f"✅ {doc.doc_id}: {doc.chunk_count} -> {count} chunks")
+        return count
+
+async def rechunk(doc_ids: List[str], concurrency: int) -> int:
+    """
+    Re-split and re-embed catalogued documents from the parse cache,
+    `concurrency` documents at a time. Returns the number of failures.
+    """
+    async with IngestSessionLocal() as db:
+        query = select(CatalogDocument).order_by(CatalogDocument.doc_id)
+        if doc_ids:
+            query = query.where(CatalogDocument.doc_id.in_(doc_ids))
+        docs = (await db.execute(query)).scalars().all()
+
+    logger.info(
+        f"🔄 Re-chunking {len(docs)} document(s) "
+        f"(size={ingestion.CHUNK_SIZE}, overlap={ingestion.CHUNK_OVERLAP}, concurrency={concurrency})"
+    )
+    semaphore = asyncio.Semaphore(concurrency)
+    results = await asyncio.gather(
+        *(rechunk_document(doc, semaphore) for doc in docs),
+        return_exceptions=True
+    )
+
+    failures = 0
+    for doc, result in zip(docs, results):
+        if isinstance(result, Exception):
+            logger.error(f"❌ {doc.doc_id}: {result}")
+        if result is None or isinstance(result, Exception):
+            failures += 1
+    logger.info(f"Re-chunked {len(docs) - failures}/{len(docs)} document(s)")
+    await dispose_engines()
+    return failures
+
+async def reembed(action: str, model: Optional[str] = None, dimensions: Optional[int] = None) -> int:
+    """Queue, inspect or cancel an online re-embedding (the leader process runs it)."""
+    try:
+        async with IngestSessionLocal() as db:
+            if action == "start":
+                if not dimensions:
+                    dimensions = await embeddings.probe_dimensions(model)
+                migration = await embedding_migration.start_migration(db, model, dimensions)
+                logger.info(
+                    f"Queued re-embedding {migration.id}: {migration.source_model} -> {model} "
+                    f"({dimensions} dimensions); the leader starts it within "
+                    f"{settings.reembed_poll_interval:g}s"
+                )
+            elif action == "status":
+                migration = await embedding_migration.get_latest_migration(db)
+                active_model, active_dimensions = await embedding_migration.load_active_embedding_model(db)
+                print(json.dumps({
+                    "active_model": active_model,
+                    "active_dimensions": active_dimensions,
+                    "migration": embedding_migration.describe_migration(migration) if migration else None
+                }, indent=2, default=str))
+            elif action == "cancel":
+                if not await embedding_migration.cancel_migration(db):
+                    logger.warning("No re-embedding in progress")
+                    return 1
+                logger.info("Re-embedding cancelled; the current embeddings keep serving")
+    except ValueError as e:
+        logger.error(f"❌ {e}")
+        return 1
+    finally:
+        await dispose_engines()
+    return 0
+
+async def snapshot_command(action: str, snapshot_dir: Path, replace: bool = False) -> int:
+    """Export the index to a snapshot directory, or load one into the database."""
+    try:
+        async with IngestSessionLocal() as db:
+            if action == "export":
+                await snapshot.export_snapshot(db, snapshot_dir)
+            elif action == "import":
+                await snapshot.import_snapshot(db, snapshot_dir, replace=replace)
+    except (ValueError, FileNotFoundError) as e:
+        logger.error(f"❌ {e}")
+        return 1
+    finally:
+        await dispose_engines()
+    return 0
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(prog="python -m app.cli", description="RAG admin commands")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    rechunk_parser = commands.add_parser("rechunk", help="Re-split and re-embed documents from the parse cache")
+    rechunk_parser.add_argument("--doc-id", action="append", default=[], help="Only this document (repeatable)")
+    rechunk_parser.add_argument("--concurrency", type=int, default=4, help="Documents processed in parallel")
+    rechunk_parser.add_argument("--chunk-size", type=int, help=f"Override CHUNK_SIZE ({settings.chunk_size})")
+    rechunk_parser.add_argument("--chunk-overlap", type=int, help=f"Override CHUNK_OVERLAP ({settings.chunk_overlap})")
+
+    reembed_parser = commands.add_parser("reembed", help="Online re-embedding into a new model")
+    reembed_actions = reembed_parser.add_subparsers(dest="action", required=True)
+    start_parser = reembed_actions.add_parser("start", help="Queue a re-embedding from stored chunk content")
+    start_parser.add_argument("--model", required=True, help="Target Ollama embedding model")
+    start_parser.add_argument("--dimensions", type=int, help="Embedding size (probed from the model if omitted)")
+    reembed_actions.add_parser("status", help="Active model and migration progress")
+    reembed_actions.add_parser("cancel", help="Abandon the migration in progress")
+
+    snapshot_parser = commands.add_parser("snapshot", help="Export or import chunks and embeddings")
+    snapshot_actions = snapshot_parser.add_subparsers(dest="action", required=True)
+    export_parser = snapshot_actions.add_parser("export", help="Write the index to a snapshot directory")
+    export_parser.add_argument("dir", type=Path)
+    import_parser = snapshot_actions.add_parser("import", help="Bulk load a snapshot (must match the active model)")
+    import_parser.add_argument("dir", type=Path)
+    import_parser.add_argument("--replace", action="store_true", help="Drop documents not in the snapshot")
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    if args.command == "rechunk":
+        # The splitter is built lazily, so overrides apply as long as they are set first
+        if args.chunk_size:
+            ingestion.CHUNK_SIZE = args.chunk_size
+        if args.chunk_overlap is not None:
+            ingestion.CHUNK_OVERLAP = args.chunk_overlap
+        failures = asyncio.run(rechunk(args.doc_id, max(1, args.concurrency)))
+        sys.exit(1 if failures else 0)
+    elif args.command == "reembed":
+        sys.exit(asyncio.run(reembed(args.action, getattr(args, "model", None), getattr(args, "dimensions", None))))
+    elif args.command == "snapshot":
+        sys.exit(asyncio.run(snapshot_command(args.action, args.dir, getattr(args, "replace", False))))
+
+if __name__ == "__main__":
+    main()
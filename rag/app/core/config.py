@@ -1,5 +1,6 @@
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from pathlib import Path
+from typing import List, Optional
 
 class Settings(BaseSettings):
     # Database
@@ -8,17 +9,97 @@ class Settings(BaseSettings):
     # Ollama settings
     ollama_base_url: str
 
-    # Model settings
+    # Connection pools: interactive queries and ingestion are pooled separately
+    # so a bulk ingest cannot starve searches. Statement timeouts in ms (0 = none)
+    query_pool_size: int = 10
+    query_max_overflow: int = 20
+    query_statement_timeout_ms: int = 30000
+    ingest_pool_size: int = 5
+    ingest_max_overflow: int = 5
+    ingest_statement_timeout_ms: int = 0  # Bulk COPY, index builds and re-embedding run long
+
+    # Read replicas for retrieval (JSON list of URLs). A replica more than
+    # replica_max_lag seconds behind, or unreachable, is skipped for the primary
+    read_replica_urls: List[str] = []
+    replica_max_lag: float = 10.0
+    replica_lag_check_interval: float = 5.0
+    replica_connect_timeout: float = 2.0  # Seconds; also bounds each lag check
+
+    # Model settings (embedding_model/embedding_dimensions are the initial model;
+    # once an online re-embedding completes, the database records the active one)
     embedding_model: str = "nomic-embed-text"
     chat_model: str = "llama3.2"
 
     # RAG settings
+    embedding_dimensions: int = 768  # Must match the vector(...) column in schema.sql
     chunk_size: int = 1000
     chunk_overlap: int = 200
     top_k_results: int = 5
+    similarity_threshold: float = 0.25  # Minimum cosine similarity, applied in SQL
+
+    # Hybrid retrieval: "vector" or "hybrid" (full-text + vector fused with RRF)
+    retrieval_mode: str = "vector"
+    hybrid_vector_weight: float = 1.0
+    hybrid_text_weight: float = 1.0
+    hybrid_rrf_k: int = 60  # Rank offset in 1 / (k + rank)
+    hybrid_candidates: int = 40  # Rows taken from each search before fusion
+
+    # Keep scanning the ANN index until filtered searches fill top_k; only
+    # applied when the database has pgvector >= 0.8, ignored otherwise
+    iterative_index_scan: bool = True
+
+    # Observability: Prometheus metrics are always on at /metrics;
+    # OpenTelemetry spans are optional (pip install 'rag[tracing]')
+    otel_enabled: bool = False
+    otel_exporter_endpoint: str = "http://localhost:4317"  # Local OTLP collector
+    otel_service_name: str = "rag-api"
+
+    # Online re-embedding (python -m app.cli reembed start --model ...), run by the leader
+    embedding_model_cache_ttl: float = 5.0  # Seconds the active model is cached per process
+    reembed_batch_size: int = 64  # Chunks embedded per batch
+    reembed_pause: float = 0.5  # Seconds between batches, leaving Ollama capacity for queries
+    reembed_poll_interval: float = 30.0  # Seconds between checks for a queued migration
+
+    # Snapshot directory (python -m app.cli snapshot export) imported on startup
+    # when the index is empty, so a new node serves without re-embedding
+    bootstrap_snapshot: Optional[Path] = None
+
+    # Opt-in JSONL log of /api/v1/query traffic (replay: python -m benchmarks.replay)
+    query_log_enabled: bool = False
+    query_log_max_bytes: int = 50 * 1024 * 1024  # Rotate each process's file at this size
+    query_log_backups: int = 5  # Rotated files kept per process
+    query_log_queue_size: int = 10000  # Records buffered before new ones are dropped
+
+    # Cache extracted text by (file hash, loader, loader version) so re-chunking skips parsing
+    parse_cache_enabled: bool = True
+    # Pruned by the leader at startup reconciliation, least recently used first (0 = no limit)
+    parse_cache_max_bytes: int = 2 * 1024 * 1024 * 1024
+    parse_cache_max_age_days: int = 180  # Entries unused this long are removed
+
+    # Seconds /status responses are cached per process
+    status_cache_ttl: float = 5.0
+
+    # Startup reconciliation of data/source, run in the background while queries are served:
+    # "incremental" ingests only new or changed documents (by file hash) and
+    # drops documents whose source file was deleted or renamed,
+    # "fresh" truncates and re-ingests everything, "off" skips it
+    startup_ingest_mode: str = "incremental"
+
+    # Leader election: one process (across workers and replicas) holds this
+    # Postgres advisory lock and owns startup ingestion and file watching
+    leader_lock_key: int = 7201843  # Any int below 2^31, shared by all processes
+    leader_renew_interval: float = 10.0  # Seconds between lease checks while leading
+    leader_retry_interval: float = 15.0  # Seconds between lock attempts while following
+
+    # Production server (python main.py --prod)
+    host: str = "0.0.0.0"
+    port: int = 8001
+    workers: int = 4
 
     # Data directories (relative to project root)
     data_dir: Path = Path(__file__).parent.parent.parent / "data"
+    parse_cache_dir: Path = Path(__file__).parent.parent.parent / "data" / "cache" / "parsed"
+    query_log_dir: Path = Path(__file__).parent.parent.parent / "data" / "logs" / "queries"
     upload_dir: Path = Path(__file__).parent.parent.parent / "data" / "uploads"
     source_dir: Path = Path(__file__).parent.parent.parent / "data" / "source"
 
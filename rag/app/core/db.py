@@ -1,30 +1,237 @@
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine, AsyncSession, async_sessionmaker
+from sqlalchemy import event, text
 from sqlalchemy.orm import declarative_base
 from app.core.config import settings
+from app.core.metrics import DB_POOL_WAIT_SECONDS, DB_REPLICA_LAG_SECONDS, register_pool_metrics
+from pathlib import Path
+from typing import List, Optional
+import asyncio
+import asyncpg
+import logging
+import random
+import time
 
-# Optimized engine with connection pooling
-engine = create_async_engine(
-    settings.database_url,
-    echo=False,  # Disable SQL echo for performance (too verbose)
-    future=True,
-    pool_size=10,  # Connection pool size
-    max_overflow=20,  # Max overflow connections
-    pool_pre_ping=True,  # Verify connections before using
-    pool_recycle=3600  # Recycle connections after 1 hour
-)
+logger = logging.getLogger(__name__)
+
+SCHEMA_PATH = Path(__file__).parent.parent.parent / "postgres" / "schema.sql"
+SCHEMA_LOCK_TIMEOUT = "5s"
+SCHEMA_LOCK_ATTEMPTS = 3
+
+def register_vector_codec(dbapi_connection, connection_record):
+    """
+    Exchange pgvector values in binary form: numpy float32 arrays are sent
+    as-is instead of being formatted as '[0.1, ...]' text and parsed back.
+    """
+    from pgvector.asyncpg import register_vector
+    try:
+        dbapi_connection.run_async(register_vector)
+    except ValueError as e:
+        # Fresh database: the extension appears once init_db() has run,
+        # which then recycles the pools so new connections get the codec
+        logger.debug(f"pgvector codec not registered: {e}")
+
+def create_engine(
+    url: str,
+    pool_name: str,
+    pool_size: int,
+    max_overflow: int,
+    statement_timeout_ms: int,
+    connect_timeout: Optional[float] = None
+) -> AsyncEngine:
+    """Engine with its own connection pool, statement timeout, pool metrics and the pgvector codec."""
+    server_settings = {"application_name": f"rag-{pool_name}"}
+    if statement_timeout_ms:
+        server_settings["statement_timeout"] = str(statement_timeout_ms)
+    connect_args = {"server_settings": server_settings}
+    if connect_timeout:
+        connect_args["timeout"] = connect_timeout
+    engine = create_async_engine(
+        url,
+        echo=False,  # Disable SQL echo for performance (too verbose)
+        future=True,
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_pre_ping=True,  # Verify connections before using
+        pool_recycle=3600,  # Recycle connections after 1 hour
+        connect_args=connect_args
+    )
+    event.listen(engine.sync_engine, "connect", register_vector_codec)
+    register_pool_metrics(engine, pool_name)
+    return engine
 
-AsyncSessionLocal = async_sessionmaker(
-    engine,
-    class_=AsyncSession,
-    expire_on_commit=False,
-    autoflush=False  # Manual flush control for better performance
+# Interactive queries and ingestion get separate pools, so a bulk ingest
+# (or a re-embedding) cannot take every connection from vector searches
+query_engine = create_engine(
+    settings.database_url, "query",
+    settings.query_pool_size, settings.query_max_overflow, settings.query_statement_timeout_ms
 )
+ingest_engine = create_engine(
+    settings.database_url, "ingest",
+    settings.ingest_pool_size, settings.ingest_max_overflow, settings.ingest_statement_timeout_ms
+)
+
+def _sessionmaker(engine: AsyncEngine) -> async_sessionmaker:
+    return async_sessionmaker(
+        engine,
+        class_=AsyncSession,
+        expire_on_commit=False,
+        autoflush=False  # Manual flush control for better performance
+    )
+
+AsyncSessionLocal = _sessionmaker(query_engine)
+IngestSessionLocal = _sessionmaker(ingest_engine)
 
 Base = declarative_base()
 
+class Replica:
+    """A read replica and its last measured replication lag (None = unreachable)."""
+
+    def __init__(self, index: int, url: str):
+        self.name = f"replica-{index}"
+        self.engine = create_engine(
+            url, self.name,
+            settings.query_pool_size, settings.query_max_overflow, settings.query_statement_timeout_ms,
+            connect_timeout=settings.replica_connect_timeout
+        )
+        self.sessionmaker = _sessionmaker(self.engine)
+        self.lag: Optional[float] = None
+
+    async def _query_lag(self) -> float:
+        async with self.engine.connect() as conn:
+            # Caught up (all received WAL replayed) counts as no lag, since
+            # the replay timestamp stops advancing while the primary is idle
+            result = await conn.execute(text("""
+                SELECT CASE
+                    WHEN NOT pg_is_in_recovery() THEN 0
+                    WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+                    ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+                END
+            """))
+            return float(result.scalar())
+
+    async def check_lag(self):
+        try:
+            # Bounded so a hung replica cannot hold up the next round of checks
+            self.lag = await asyncio.wait_for(self._query_lag(), timeout=settings.replica_connect_timeout)
+        except Exception as e:
+            if self.lag is not None:
+                logger.warning(f"Read replica {self.name} unavailable: {str(e)[:100]}")
+            self.lag = None
+        DB_REPLICA_LAG_SECONDS.labels(pool=self.name).set(-1 if self.lag is None else self.lag)
+
+    def mark_unavailable(self, error: Exception):
+        """Stop routing reads here until the next lag check finds it healthy again."""
+        logger.warning(f"Read replica {self.name} failed, reading from the primary: {str(error)[:100]}")
+        self.lag = None
+        DB_REPLICA_LAG_SECONDS.labels(pool=self.name).set(-1)
+
+replicas: List[Replica] = [Replica(i, url) for i, url in enumerate(settings.read_replica_urls)]
+_replica_monitor: Optional[asyncio.Task] = None
+
+async def _monitor_replicas():
+    while True:
+        await asyncio.gather(*(replica.check_lag() for replica in replicas))
+        await asyncio.sleep(settings.replica_lag_check_interval)
+
+def start_replica_monitor():
+    """Measure replica lag every REPLICA_LAG_CHECK_INTERVAL seconds in the background (no-op without replicas)."""
+    global _replica_monitor
+    if replicas and _replica_monitor is None:
+        _replica_monitor = asyncio.create_task(_monitor_replicas())
+        logger.info(f"🔁 Routing retrieval to {len(replicas)} read replica(s) within {settings.replica_max_lag:g}s lag")
+
+async def stop_replica_monitor():
+    global _replica_monitor
+    if _replica_monitor is not None:
+        _replica_monitor.cancel()
+        try:
+            await _replica_monitor
+        except asyncio.CancelledError:
+            pass
+        _replica_monitor = None
+
+def choose_read_replica() -> Optional[Replica]:
+    """
+    A random replica within REPLICA_MAX_LAG seconds of the primary as of
+    the last background check, or None to read from the primary (also
+    until the first check has completed).
+    """
+    healthy = [r for r in replicas if r.lag is not None and r.lag <= settings.replica_max_lag]
+    return random.choice(healthy) if healthy else None
+
+async def _checked_out(session: AsyncSession, pool_name: str) -> AsyncSession:
+    """Check out the session's connection now, recording how long the pool took to provide it."""
+    start = time.perf_counter()
+    await session.connection()
+    DB_POOL_WAIT_SECONDS.labels(pool=pool_name).observe(time.perf_counter() - start)
+    return session
+
 async def get_db():
+    """Session on the primary's query pool."""
     async with AsyncSessionLocal() as session:
         try:
-            yield session
+            yield await _checked_out(session, "query")
         finally:
             await session.close()
+
+async def get_read_db():
+    """
+    Read-only session for retrieval: a healthy read replica if configured,
+    else the primary. A replica that cannot provide a connection is taken
+    out of rotation and the request reads from the primary instead.
+    """
+    replica = choose_read_replica()
+    if replica is not None:
+        session = replica.sessionmaker()
+        try:
+            await _checked_out(session, replica.name)
+        except Exception as e:
+            await session.close()
+            replica.mark_unavailable(e)
+        else:
+            try:
+                yield session
+            finally:
+                await session.close()
+            return
+    async for session in get_db():
+        yield session
+
+async def get_ingest_db():
+    """Session on the primary's ingest pool, for long write transactions."""
+    async with IngestSessionLocal() as session:
+        try:
+            yield await _checked_out(session, "ingest")
+        finally:
+            await session.close()
+
+async def dispose_engines():
+    for engine in [query_engine, ingest_engine, *(replica.engine for replica in replicas)]:
+        await engine.dispose()
+
+async def init_db():
+    """
+    Apply postgres/schema.sql so existing databases pick up new tables,
+    columns and indexes. Every statement is idempotent; an advisory lock
+    serialises concurrent workers running it at the same time.
+    """
+    schema_sql = SCHEMA_PATH.read_text()
+    for attempt in range(1, SCHEMA_LOCK_ATTEMPTS + 1):
+        try:
+            async with ingest_engine.connect() as conn:
+                raw = await conn.get_raw_connection()
+                driver_conn = raw.driver_connection
+                async with driver_conn.transaction():
+                    await driver_conn.execute("SELECT pg_advisory_xact_lock(hashtext('wolfie_rag_schema'))")
+                    # A statement that needs a table lock gives up instead of
+                    # queueing behind in-flight searches and blocking new ones
+                    await driver_conn.execute(f"SET LOCAL lock_timeout = '{SCHEMA_LOCK_TIMEOUT}'")
+                    await driver_conn.execute(schema_sql)
+            break
+        except asyncpg.exceptions.LockNotAvailableError:
+            if attempt == SCHEMA_LOCK_ATTEMPTS:
+                raise
+            logger.warning(f"Schema update waited over {SCHEMA_LOCK_TIMEOUT} for a table lock, retrying ({attempt}/{SCHEMA_LOCK_ATTEMPTS})")
+            await asyncio.sleep(attempt)
+    # Drop connections opened before the vector type existed
+    await dispose_engines()
@@ -0,0 +1,196 @@
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
+from contextvars import ContextVar
+from typing import Awaitable, Callable, Optional
+from app.core.config import settings
+from app.core.db import ingest_engine
+import asyncio
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+# The election of this process, and whether the current task (or thread)
+# is doing leader-only work whose writes must be fenced on the lease
+_election: Optional["LeaderElection"] = None
+_leader_work: ContextVar[bool] = ContextVar("leader_work", default=False)
+
+def mark_leader_work():
+    """Fence the writes of the current task, and of tasks it creates from now on."""
+    _leader_work.set(True)
+
+async def check_leadership(db: AsyncSession):
+    """
+    Call inside a write transaction, before committing. In leader-only work
+    it raises RuntimeError unless this process's lock session still holds
+    the leader lock, so a leader that lost its lease (but has not noticed
+    yet) cannot write alongside the new one. Elsewhere it does nothing.
+    """
+    if not _leader_work.get():
+        return
+    election = _election
+    if election is None or not election.is_leader or election.backend_pid is None:
+        raise RuntimeError("No longer the leader; refusing to write")
+    held = (await db.execute(
+        text("""
+            SELECT EXISTS (
+                SELECT 1 FROM pg_locks
+                WHERE locktype = 'advisory' AND pid = :pid
+                  AND classid = 0 AND objid = :key AND granted
+            )
+        """),
+        {"pid": election.backend_pid, "key": election.lock_key}
+    )).scalar()
+    if not held:
+        raise RuntimeError("Leader lock lost; refusing to write")
+
+class LeaderElection:
+    """
+    Leader election through a Postgres session-level advisory lock.
+
+    Every process competes for the same lock; the one holding it runs the
+    leader-only work (startup reconciliation, file watching) while all of
+    them serve queries. The lock lives on a dedicated connection, and the
+    lease is renewed by checking that this session still holds it. If the
+    check fails or the connection dies, the process steps down right away.
+    Postgres releases the lock with the session, so a follower picks it up
+    on its next attempt. The lock session has server-side TCP keepalives and
+    an idle timeout, so a leader that vanishes without closing it (half-open
+    connection) does not hold the lock forever. Leader work also re-checks
+    the lock inside each write transaction (check_leadership).
+    """
+
+    def __init__(
+        self,
+        on_elected: Callable[[], Awaitable[None]],
+        on_demoted: Callable[[], Awaitable[None]],
+        lock_key: int = None,
+        renew_interval: float = None,
+        retry_interval: float = None
+    ):
+        self.on_elected = on_elected
+        self.on_demoted = on_demoted
+        self.lock_key = settings.leader_lock_key if lock_key is None else lock_key
+        self.renew_interval = settings.leader_renew_interval if renew_interval is None else renew_interval
+        self.retry_interval = settings.leader_retry_interval if retry_interval is None else retry_interval
+        self.is_leader = False
+        self.backend_pid: Optional[int] = None  # Server pid of the lock session
+        self._conn: Optional[AsyncConnection] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        global _election
+        _election = self
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Step down (if leading), release the lock and close the connection."""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        await self._step_down()
+        if self._conn is not None:
+            try:
+                await self._conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": self.lock_key})
+            except Exception:
+                pass  # Closing the session releases it anyway
+            await self._close(invalidate=False)
+
+    async def _run(self):
+        while True:
+            try:
+                if self._conn is None:
+                    conn = await ingest_engine.connect()
+                    # Autocommit: the lock is session-scoped, and an open
+                    # transaction would sit "idle in transaction" forever
+                    self._conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+                    self.backend_pid = await self._configure_session()
+
+                if self.is_leader:
+                    if not await asyncio.wait_for(self._holds_lock(), timeout=self.renew_interval):
+                        logger.warning("Leader lock no longer held")
+                        await self._step_down()
+                else:
+                    result = await self._conn.execute(
+                        text("SELECT pg_try_advisory_lock(:key)"), {"key": self.lock_key}
+                    )
+                    if result.scalar():
+                        self.is_leader = True
+                        logger.info(f"👑 Process {os.getpid()} elected leader")
+                        await self.on_elected()
+
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Lost or unusable connection: the server drops the lock with the
+                # session, so stop leader work now and reconnect on the next pass
+                logger.warning(f"Leader election connection failed: {str(e)[:100]}")
+                await self._step_down()
+                await self._close()
+
+            await asyncio.sleep(self.renew_interval if self.is_leader else self.retry_interval)
+
+    async def _configure_session(self) -> int:
+        """
+        Let the server notice a dead lock session within a few renew
+        intervals: TCP keepalives catch a vanished host, idle_session_timeout
+        (Postgres 14+) a client that stopped renewing. Returns the backend pid.
+        """
+        interval = max(1, int(self.renew_interval))
+        await self._conn.execute(
+            text("""
+                SELECT set_config('tcp_keepalives_idle', :idle, false),
+                       set_config('tcp_keepalives_interval', :interval, false),
+                       set_config('tcp_keepalives_count', '3', false)
+            """),
+            {"idle": str(interval), "interval": str(max(1, interval // 3))}
+        )
+        row = (await self._conn.execute(
+            text("SELECT pg_backend_pid(), current_setting('server_version_num')::int")
+        )).one()
+        if row[1] >= 140000:
+            await self._conn.execute(
+                text("SELECT set_config('idle_session_timeout', :timeout, false)"),
+                {"timeout": str(interval * 3 * 1000)}
+            )
+        return row[0]
+
+    async def _holds_lock(self) -> bool:
+        # Keys below 2^31 are stored in pg_locks as classid 0, objid key
+        result = await self._conn.execute(
+            text("""
+                SELECT EXISTS (
+                    SELECT 1 FROM pg_locks
+                    WHERE locktype = 'advisory' AND pid = pg_backend_pid()
+                      AND classid = 0 AND objid = :key AND granted
+                )
+            """),
+            {"key": self.lock_key}
+        )
+        return bool(result.scalar())
+
+    async def _step_down(self):
+        if not self.is_leader:
+            return
+        self.is_leader = False
+        logger.info(f"Process {os.getpid()} stepping down as leader")
+        try:
+            await self.on_demoted()
+        except Exception as e:
+            logger.error(f"Error while stepping down: {e}")
+
+    async def _close(self, invalidate: bool = True):
+        """Drop the lock connection; invalidate it unless it was cleanly unlocked."""
+        if self._conn is None:
+            return
+        conn, self._conn = self._conn, None
+        self.backend_pid = None
+        try:
+            if invalidate:
+                await conn.invalidate()
+            await conn.close()
+        except Exception:
+            pass
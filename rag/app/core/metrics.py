@@ -0,0 +1,186 @@
+from prometheus_client import Counter, Histogram, Gauge, CollectorRegistry, generate_latest, multiprocess, CONTENT_TYPE_LATEST
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from typing import Dict, Optional, Tuple
+from app.core.config import settings
+from sqlalchemy import event
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+# With several workers (python main.py --prod) each process writes its
+# samples under PROMETHEUS_MULTIPROC_DIR and /metrics aggregates them all.
+# Gauges declare how their per-process values combine.
+
+# Latency buckets from 5ms up to 2 minutes (LLM generation and large ingests)
+STAGE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+QUERY_STAGE_SECONDS = Histogram(
+    "rag_query_stage_seconds",
+    "Time spent in each stage of the query pipeline",
+    ["stage"],  # embed, search, context, first_token, generation
+    buckets=STAGE_BUCKETS
+)
+
+INGEST_STAGE_SECONDS = Histogram(
+    "rag_ingest_stage_seconds",
+    "Time spent in each stage of the ingestion pipeline",
+    ["stage"],  # parse, split, embed_batch, db_write
+    buckets=STAGE_BUCKETS
+)
+
+DB_POOL_CONNECTIONS = Gauge(
+    "rag_db_pool_connections",
+    "Database connection pool usage, summed over workers",
+    ["pool", "state"],  # state: size, checked_out, idle, overflow
+    multiprocess_mode="livesum"
+)
+
+DB_POOL_WAIT_SECONDS = Histogram(
+    "rag_db_pool_wait_seconds",
+    "Time for a request to get a connection from its pool",
+    ["pool"],  # query, ingest, replica-N
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+)
+
+DB_REPLICA_LAG_SECONDS = Gauge(
+    "rag_db_replica_lag_seconds",
+    "Last measured replication lag of each read replica (-1 = unreachable)",
+    ["pool"],
+    multiprocess_mode="livemostrecent"
+)
+
+INGEST_QUEUE_DEPTH = Gauge(
+    "rag_ingest_queue_depth",
+    "Files waiting for or undergoing ingestion",
+    multiprocess_mode="livesum"  # Only the leader moves it
+)
+
+PARSE_CACHE_REQUESTS = Counter(
+    "rag_parse_cache_requests",
+    "Parsed-text cache lookups",
+    ["outcome"]  # hit, miss
+)
+
+QUERY_LOG_RECORDS = Counter(
+    "rag_query_log_records",
+    "Query log records by outcome",
+    ["outcome"]  # written, dropped (queue full or write error)
+)
+
+EMBEDDING_MIGRATION_CHUNKS = Gauge(
+    "rag_embedding_migration_chunks",
+    "Progress of the running online re-embedding",
+    ["state"],  # processed, total
+    multiprocess_mode="livemax"  # Only the leader sets it
+)
+
+# Per-request stage timings (seconds), set up by start_stage_timings()
+_stage_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar("stage_timings", default=None)
+
+# Lazy initialization - tracer is only created when OTEL_ENABLED is set
+_tracer = None
+_tracing_unavailable = False
+
+def start_stage_timings() -> Dict[str, float]:
+    """Collect stage durations recorded in the current task into the returned dict."""
+    timings: Dict[str, float] = {}
+    _stage_timings.set(timings)
+    return timings
+
+def format_server_timing(timings: Dict[str, float]) -> str:
+    """Render stage timings as a Server-Timing header value (durations in ms)."""
+    return ", ".join(f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in timings.items())
+
+def get_tracer():
+    """Lazy load OpenTelemetry tracer (optional dependency)."""
+    global _tracer, _tracing_unavailable
+    if not settings.otel_enabled or _tracing_unavailable:
+        return None
+    if _tracer is None:
+        try:
+            from opentelemetry import trace
+            from opentelemetry.sdk.resources import Resource
+            from opentelemetry.sdk.trace import TracerProvider
+            from opentelemetry.sdk.trace.export import BatchSpanProcessor
+            from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
+        except ImportError:
+            logger.warning("OTEL_ENABLED is set but OpenTelemetry is not installed (pip install 'rag[tracing]')")
+            _tracing_unavailable = True
+            return None
+
+        provider = TracerProvider(resource=Resource.create({"service.name": settings.otel_service_name}))
+        provider.add_span_processor(
+            BatchSpanProcessor(OTLPSpanExporter(endpoint=settings.otel_exporter_endpoint, insecure=True))
+        )
+        trace.set_tracer_provider(provider)
+        _tracer = trace.get_tracer("rag")
+    return _tracer
+
+def record_stage(histogram: Histogram, stage: str, seconds: float):
+    """Record a stage duration measured by the caller."""
+    histogram.labels(stage=stage).observe(seconds)
+    timings = _stage_timings.get()
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + seconds
+
+@contextmanager
+def observe_stage(histogram: Histogram, pipeline: str, stage: str):
+    """Time a block into the stage histogram and, if enabled, an OpenTelemetry span."""
+    tracer = get_tracer()
+    span = tracer.start_as_current_span(f"{pipeline}.{stage}") if tracer else nullcontext()
+    start = time.perf_counter()
+    with span:
+        try:
+            yield
+        finally:
+            record_stage(histogram, stage, time.perf_counter() - start)
+
+def observe_query_stage(stage: str):
+    return observe_stage(QUERY_STAGE_SECONDS, "query", stage)
+
+def observe_ingest_stage(stage: str):
+    return observe_stage(INGEST_STAGE_SECONDS, "ingest", stage)
+
+def record_query_stage(stage: str, seconds: float):
+    record_stage(QUERY_STAGE_SECONDS, stage, seconds)
+
+def register_pool_metrics(engine, pool_name: str):
+    """
+    Report pool usage of an engine, updated from pool events (rather than
+    read at scrape time, which only works for the process being scraped).
+    """
+    size = engine.pool.size()
+    counts = {"open": 0, "checked_out": 0}
+
+    def update(delta_open: int = 0, delta_checked_out: int = 0):
+        counts["open"] += delta_open
+        counts["checked_out"] += delta_checked_out
+        DB_POOL_CONNECTIONS.labels(pool=pool_name, state="checked_out").set(counts["checked_out"])
+        DB_POOL_CONNECTIONS.labels(pool=pool_name, state="idle").set(max(counts["open"] - counts["checked_out"], 0))
+        DB_POOL_CONNECTIONS.labels(pool=pool_name, state="overflow").set(max(counts["open"] - size, 0))
+
+    DB_POOL_CONNECTIONS.labels(pool=pool_name, state="size").set(size)
+    update()
+    event.listen(engine.sync_engine, "connect", lambda *_: update(delta_open=1))
+    event.listen(engine.sync_engine, "close", lambda *_: update(delta_open=-1))
+    event.listen(engine.sync_engine, "checkout", lambda *_: update(delta_checked_out=1))
+    event.listen(engine.sync_engine, "checkin", lambda *_: update(delta_checked_out=-1))
+
+def multiprocess_enabled() -> bool:
+    return bool(os.environ.get("PROMETHEUS_MULTIPROC_DIR"))
+
+def render_metrics() -> Tuple[bytes, str]:
+    """Render all metrics in Prometheus text format, across all workers in multiprocess mode."""
+    if multiprocess_enabled():
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(), CONTENT_TYPE_LATEST
+
+def mark_worker_stopped():
+    """Drop this worker's live gauges from the aggregate on shutdown."""
+    if multiprocess_enabled():
+        multiprocess.mark_process_dead(os.getpid())
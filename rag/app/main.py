@@ -1,14 +1,23 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Query, Response
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 from app.api.v1 import ingestion, query
-from app.core.db import get_db
+from app.core.db import get_ingest_db, get_read_db, init_db, dispose_engines, start_replica_monitor, stop_replica_monitor
 from app.services.ingestion import ingest_file
+from app.services.catalog import get_catalog_status, get_catalog_hashes, get_catalog_filenames, delete_documents
+from app.services.snapshot import bootstrap_from_snapshot
+from app.services import parse_cache
+from app.services.query_log import start_query_log, stop_query_log
 from app.core.config import settings
+from app.core.metrics import INGEST_QUEUE_DEPTH, render_metrics, mark_worker_stopped
+from app.core.leader import LeaderElection, mark_leader_work, check_leadership
+from app.services.embedding_migration import run_worker as run_embedding_migrations
 import logging
 import asyncio
+import hashlib
 import os
 from pathlib import Path
+from typing import Optional
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
 import threading
@@ -29,10 +38,11 @@ class DataFileHandler(FileSystemEventHandler):
         self.source_dir = data_dir / "source"
         self.uploads_dir = data_dir / "uploads"
         self.processing_files = set()  # Track files being processed
+        self.stopped = False  # Set on demotion: queued files are left to the next leader
 
     def on_created(self, event):
         """Called when a file is created in the watched directory."""
-        if event.is_directory:
+        if event.is_directory or self.stopped:
             return
 
         file_path = Path(event.src_path)
@@ -62,6 +72,7 @@ class DataFileHandler(FileSystemEventHandler):
         # Process the file asynchronously
         logger.info(f"New file detected: {file_path.name}")
         self.processing_files.add(file_path)
+        INGEST_QUEUE_DEPTH.inc()
 
         # Run processing in a separate thread to avoid blocking
         threading.Thread(
@@ -84,6 +95,7 @@ class DataFileHandler(FileSystemEventHandler):
             logger.error(f"Error processing file {file_path.name}: {e}")
         finally:
             self.processing_files.discard(file_path)
+            INGEST_QUEUE_DEPTH.dec()
             try:
                 loop.close()
             except:
@@ -91,9 +103,13 @@ class DataFileHandler(FileSystemEventHandler):
 
     async def _process_file_async(self, file_path: Path):
         """Process a file asynchronously."""
+        if self.stopped:
+            return
+        # Runs on this thread's own loop, so fence its writes here
+        mark_leader_work()
         try:
             # Get database session
-            async for db in get_db():
+            async for db in get_ingest_db():
                 # Read file
                 file_bytes = file_path.read_bytes()
 
@@ -115,36 +131,92 @@ class DataFileHandler(FileSystemEventHandler):
         except Exception as e:
             logger.error(f"Failed to process {file_path.name}: {e}")
 
+class LeaderDuties:
+    """Work that only the elected leader runs: source reconciliation, file watching and re-embedding."""
+
+    def __init__(self):
+        self.observer = None
+        self.event_handler = None
+        self.reconcile_task = None
+        self.migration_task = None
+
+    async def start(self):
+        # Tasks created below inherit this, so their writes check the lease
+        mark_leader_work()
+
+        # Reconcile source files in the background (queries are served
+        # from the existing index meanwhile)
+        logger.info(f"Starting background processing of source files (mode={settings.startup_ingest_mode})...")
+        self.reconcile_task = asyncio.create_task(process_source_files())
+
+        # Run (or resume) a queued online re-embedding
+        self.migration_task = asyncio.create_task(run_embedding_migrations())
+
+        # Start file watcher for data directory
+        logger.info("Starting file watcher for data directory...")
+        self.observer = Observer()
+        data_dir = Path(settings.data_dir)
+        self.event_handler = DataFileHandler(data_dir)
+        self.observer.schedule(self.event_handler, str(data_dir), recursive=True)
+        self.observer.start()
+
+    async def stop(self):
+        # Stop file processing first: threads already running check the
+        # lease before committing, so they cannot write after this
+        if self.event_handler:
+            self.event_handler.stopped = True
+            self.event_handler = None
+
+        if self.reconcile_task and not self.reconcile_task.done():
+            logger.info("Cancelling source reconciliation...")
+            self.reconcile_task.cancel()
+        self.reconcile_task = None
+
+        if self.migration_task:
+            # Progress is committed per batch; the next leader resumes it
+            self.migration_task.cancel()
+            self.migration_task = None
+
+        if self.observer:
+            logger.info("Stopping file watcher...")
+            self.observer.unschedule_all()
+            self.observer.stop()
+            await asyncio.to_thread(self.observer.join)
+            self.observer = None
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Handle application startup and shutdown events."""
-    # Startup: Process source files and start file watcher
-    logger.info("Starting background processing of source files...")
-    asyncio.create_task(process_source_files())
-
-    # Start file watcher for data directory
-    logger.info("Starting file watcher for data directory...")
-    observer = Observer()
-    data_dir = Path(settings.data_dir)
-    event_handler = DataFileHandler(data_dir)
-    observer.schedule(event_handler, str(data_dir), recursive=True)
-    observer.start()
+    # Bring the schema (tables, columns, indexes) up to date before serving
+    await init_db()
+    start_replica_monitor()
+    start_query_log()
+
+    # Startup: every worker serves queries; only the process holding the
+    # leader lock reconciles source files and watches the data directory
+    duties = LeaderDuties()
+    leadership = LeaderElection(on_elected=duties.start, on_demoted=duties.stop)
+    app.state.leadership = leadership
+    leadership.start()
 
     yield
 
-    # Shutdown: Stop file watcher and clean up
-    logger.info("Stopping file watcher...")
-    observer.stop()
-    observer.join()
+    # Shutdown: Release leadership (stops file watcher) and clean up
+    await leadership.stop()
+    await stop_query_log()
+    await stop_replica_monitor()
+    await dispose_engines()
+    mark_worker_stopped()
     logger.info("Shutting down RAG API...")
 
 async def clear_all_embeddings():
     """Clear all embeddings from database on startup for fresh training."""
     logger.info("🔄 Clearing all existing embeddings from database...")
     try:
-        async for db in get_db():
+        async for db in get_ingest_db():
             from sqlalchemy import text
-            await db.execute(text("TRUNCATE TABLE document_chunks;"))
+            await db.execute(text("TRUNCATE TABLE document_chunks, documents;"))
+            await check_leadership(db)
             await db.commit()
             logger.info("✓ Database cleared successfully")
             break
@@ -152,10 +224,64 @@ async def clear_all_embeddings():
         logger.error(f"Failed to clear database: {e}")
         raise
 
+async def get_indexed_hashes() -> dict:
+    """doc_id -> file hash of every document in the catalog."""
+    hashes = {}
+    async for db in get_ingest_db():
+        hashes = await get_catalog_hashes(db)
+        break
+    return hashes
+
+def is_unchanged(file_path: Path, indexed_hashes: dict) -> bool:
+    """True if the file is catalogued with the same content hash."""
+    indexed_hash = indexed_hashes.get(file_path.stem)
+    # Documents catalogued before hashes were recorded count as changed, so
+    # they are re-ingested once and get their hash and filename filled in
+    if indexed_hash is None:
+        return False
+    return indexed_hash == hashlib.sha256(file_path.read_bytes()).hexdigest()
+
+def is_missing_source(doc_id: str, filename: Optional[str], source_dir: Path) -> bool:
+    """
+    True for a document ingested from source_dir whose file is gone.
+    Source files are catalogued as doc_id = file stem; uploads (which keep a
+    copy in upload_dir as {timestamp}_{doc_id}_{filename}) are never removed.
+    """
+    if not filename or Path(filename).stem != doc_id:
+        return False
+    if Path(filename).suffix.lower() not in settings.allowed_extensions:
+        return False
+    if (source_dir / filename).exists():
+        return False
+    return not any(settings.upload_dir.glob(f"*_{doc_id}_{filename}"))
+
+async def remove_missing_sources(source_dir: Path):
+    """Drop documents whose source file was deleted or renamed since they were ingested."""
+    async for db in get_ingest_db():
+        filenames = await get_catalog_filenames(db)
+        removed = [doc_id for doc_id, filename in filenames.items() if is_missing_source(doc_id, filename, source_dir)]
+        if removed:
+            await delete_documents(db, removed)
+            logger.info(f"🗑️  Removed {len(removed)} document(s) no longer in {source_dir}: {', '.join(sorted(removed)[:10])}")
+        break
+
 async def process_source_files():
-    """Process all files in the source directory on startup."""
-    # Clear all old embeddings first for fresh training
-    await clear_all_embeddings()
+    """Reconcile the index with the source directory on startup."""
+    # The parse cache only grows otherwise
+    if settings.parse_cache_enabled:
+        try:
+            await asyncio.to_thread(parse_cache.prune)
+        except Exception as e:
+            logger.warning(f"Parse cache pruning failed: {e}")
+
+    mode = settings.startup_ingest_mode
+    if mode == "off":
+        logger.info("Startup ingestion disabled - serving the existing index")
+        return
+
+    if mode == "fresh":
+        # Clear all old embeddings first for fresh training
+        await clear_all_embeddings()
 
     source_dir = Path(settings.source_dir)
     if not source_dir.exists():
@@ -168,14 +294,33 @@ async def process_source_files():
         if f.is_file() and f.suffix.lower() in settings.allowed_extensions
     ]
 
+    if mode == "incremental":
+        # An empty index is seeded from BOOTSTRAP_SNAPSHOT first, so only
+        # files that changed since the snapshot go through Ollama
+        async for db in get_ingest_db():
+            if await bootstrap_from_snapshot(db):
+                logger.info(f"✓ Bootstrapped index from snapshot {settings.bootstrap_snapshot}")
+            break
+
+        # An empty directory more likely means a missing mount than a deleted corpus
+        if files_to_process:
+            await remove_missing_sources(source_dir)
+        else:
+            logger.warning(f"No source files in {source_dir}; keeping all indexed documents")
+
+        # Unchanged documents keep serving as-is; new or modified ones are re-ingested
+        indexed_hashes = await get_indexed_hashes()
+        files_to_process = [f for f in files_to_process if not is_unchanged(f, indexed_hashes)]
+
     if not files_to_process:
         logger.info("No files to process in source directory")
         return
 
-    logger.info(f"📚 Starting fresh training with {len(files_to_process)} files")
+    logger.info(f"📚 Starting {mode} training with {len(files_to_process)} files")
+    INGEST_QUEUE_DEPTH.inc(len(files_to_process))
 
     # Get database session
-    async for db in get_db():
+    async for db in get_ingest_db():
         try:
             total_chunks = 0
             successful_files = 0
@@ -208,7 +353,10 @@ async def process_source_files():
                     logger.error(f"✗ {file_path.name}: {str(e)[:100]}")
                     continue  # Continue with next file on error
 
-            logger.info(f"✅ Fresh training complete: {successful_files}/{len(files_to_process)} files, {total_chunks} total chunks")
+                finally:
+                    INGEST_QUEUE_DEPTH.dec()
+
+            logger.info(f"✅ Training complete: {successful_files}/{len(files_to_process)} files, {total_chunks} total chunks")
             logger.info(f"📊 System ready - Watchdog will monitor for file updates")
             break  # Exit the async for loop after one iteration
 
@@ -248,29 +396,25 @@ async def root():
 async def health():
     return {"status": "healthy"}
 
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics (stage latencies, DB pool usage, ingestion queue depth)."""
+    content, content_type = render_metrics()
+    return Response(content=content, media_type=content_type)
+
 @app.get("/status")
-async def status():
-    """Get system status including document counts."""
-    from sqlalchemy import text
+async def status(
+    limit: int = Query(100, ge=1, le=1000),
+    offset: int = Query(0, ge=0)
+):
+    """Get system status including document counts (paginated, from the document catalog)."""
     try:
-        async for db in get_db():
-            # Get document counts
-            result = await db.execute(
-                text("SELECT doc_id, COUNT(*) as chunks FROM document_chunks GROUP BY doc_id ORDER BY doc_id")
-            )
-            docs = [{"doc_id": row[0], "chunks": row[1]} for row in result.fetchall()]
-
-            # Get total chunks
-            total_result = await db.execute(
-                text("SELECT COUNT(*) FROM document_chunks")
-            )
-            total_chunks = total_result.scalar()
-
+        async for db in get_read_db():
+            catalog_status = await get_catalog_status(db, limit=limit, offset=offset)
             return {
                 "status": "healthy",
-                "documents": len(docs),
-                "total_chunks": total_chunks,
-                "documents_detail": docs
+                "leader": app.state.leadership.is_leader,
+                **catalog_status
             }
     except Exception as e:
         logger.error(f"Status check failed: {e}")
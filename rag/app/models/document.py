@@ -1,7 +1,9 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, JSON
+from sqlalchemy import Column, Integer, BigInteger, String, Text, DateTime, Computed, CHAR
+from sqlalchemy.dialects.postgresql import JSONB, TSVECTOR
 from sqlalchemy.sql import func
 from pgvector.sqlalchemy import Vector
 from app.core.db import Base
+from app.core.config import settings
 
 class DocumentChunk(Base):
     __tablename__ = "document_chunks"
@@ -10,6 +12,38 @@ class DocumentChunk(Base):
     doc_id = Column(String(255), nullable=False, index=True)
     chunk_id = Column(Integer, nullable=False)
     content = Column(Text, nullable=False)
-    embedding = Column(Vector(768))  # Gemini embedding dimension
-    chunk_metadata = Column(JSON)
+    embedding = Column(Vector(settings.embedding_dimensions))
+    chunk_metadata = Column(JSONB)
+    content_tsv = Column(TSVECTOR, Computed("to_tsvector('english', content)", persisted=True))
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class EmbeddingMigration(Base):
+    """An online re-embedding of document_chunks into a new model, with its progress."""
+    __tablename__ = "embedding_migrations"
+
+    id = Column(Integer, primary_key=True)
+    source_model = Column(String(255))
+    target_model = Column(String(255), nullable=False)
+    target_dimensions = Column(Integer, nullable=False)
+    status = Column(String(32), nullable=False, default="pending")
+    last_chunk_id = Column(Integer, nullable=False, default=0)  # Keyset cursor of the backfill
+    processed = Column(Integer, nullable=False, default=0)
+    total = Column(Integer)
+    error = Column(Text)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    started_at = Column(DateTime(timezone=True))
+    updated_at = Column(DateTime(timezone=True))
+    finished_at = Column(DateTime(timezone=True))
+
+class CatalogDocument(Base):
+    """One row per ingested document, maintained alongside its chunks."""
+    __tablename__ = "documents"
+
+    doc_id = Column(String(255), primary_key=True)
+    filename = Column(String(512))
+    chunk_count = Column(Integer, nullable=False, default=0)
+    size_bytes = Column(BigInteger)
+    file_hash = Column(CHAR(64))  # sha256 of the source file
+    ingest_duration_ms = Column(Integer)
+    embedding_model = Column(String(255))
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
@@ -1,5 +1,5 @@
-from pydantic import BaseModel
-from typing import Optional, List
+from pydantic import BaseModel, Field
+from typing import Optional, List, Dict, Any, Literal
 
 class IngestRequest(BaseModel):
     doc_id: str
@@ -12,6 +12,12 @@ class IngestResponse(BaseModel):
 class QueryRequest(BaseModel):
     question: str
     top_k: Optional[int] = 5
+    doc_ids: Optional[List[str]] = None  # Restrict retrieval to these documents
+    metadata_filter: Optional[Dict[str, Any]] = None  # JSONB containment on chunk_metadata
+    similarity_threshold: Optional[float] = Field(default=None, ge=0.0, le=1.0)
+    retrieval_mode: Optional[Literal["vector", "hybrid"]] = None
+    vector_weight: Optional[float] = Field(default=None, ge=0.0)  # RRF weight for vector search
+    text_weight: Optional[float] = Field(default=None, ge=0.0)  # RRF weight for full-text search
 
 class SourceChunk(BaseModel):
     doc_id: str
@@ -0,0 +1,78 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, func, delete
+from app.models.document import CatalogDocument, DocumentChunk
+from app.core.config import settings
+from app.core.leader import check_leadership
+from typing import Dict, List, Optional, Tuple
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# Short-lived cache of /status pages: (limit, offset) -> (expires_at, payload)
+_status_cache: Dict[Tuple[int, int], Tuple[float, dict]] = {}
+MAX_CACHED_PAGES = 64
+
+async def get_catalog_status(db: AsyncSession, limit: int = 100, offset: int = 0) -> dict:
+    """
+    Document counts for /status, read from the documents catalog rather
+    than aggregating document_chunks. Pages are cached for
+    STATUS_CACHE_TTL seconds.
+    """
+    key = (limit, offset)
+    now = time.monotonic()
+    cached = _status_cache.get(key)
+    if cached and cached[0] > now:
+        return cached[1]
+
+    totals = (await db.execute(
+        select(func.count(), func.coalesce(func.sum(CatalogDocument.chunk_count), 0))
+    )).one()
+
+    result = await db.execute(
+        select(CatalogDocument).order_by(CatalogDocument.doc_id).limit(limit).offset(offset)
+    )
+    docs = [
+        {
+            "doc_id": doc.doc_id,
+            "chunks": doc.chunk_count,
+            "filename": doc.filename,
+            "size_bytes": doc.size_bytes,
+            "file_hash": doc.file_hash,
+            "ingest_duration_ms": doc.ingest_duration_ms,
+            "embedding_model": doc.embedding_model,
+            "updated_at": doc.updated_at.isoformat() if doc.updated_at else None
+        }
+        for doc in result.scalars().all()
+    ]
+
+    payload = {
+        "documents": totals[0],
+        "total_chunks": int(totals[1]),
+        "limit": limit,
+        "offset": offset,
+        "documents_detail": docs
+    }
+
+    if len(_status_cache) >= MAX_CACHED_PAGES:
+        _status_cache.clear()
+    _status_cache[key] = (now + settings.status_cache_ttl, payload)
+    return payload
+
+async def get_catalog_hashes(db: AsyncSession) -> Dict[str, Optional[str]]:
+    """doc_id -> file hash for every catalogued document (None if unknown)."""
+    result = await db.execute(select(CatalogDocument.doc_id, CatalogDocument.file_hash))
+    return {row[0]: row[1] for row in result.fetchall()}
+
+async def get_catalog_filenames(db: AsyncSession) -> Dict[str, Optional[str]]:
+    """doc_id -> original filename for every catalogued document."""
+    result = await db.execute(select(CatalogDocument.doc_id, CatalogDocument.filename))
+    return {row[0]: row[1] for row in result.fetchall()}
+
+async def delete_documents(db: AsyncSession, doc_ids: List[str]) -> None:
+    """Remove documents' chunks and catalog rows in one transaction."""
+    await db.execute(delete(DocumentChunk).where(DocumentChunk.doc_id.in_(doc_ids)))
+    await db.execute(delete(CatalogDocument).where(CatalogDocument.doc_id.in_(doc_ids)))
+    await check_leadership(db)
+    await db.commit()
+    _status_cache.clear()
@@ -0,0 +1,361 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy import select, update, func, text
+from app.core.config import settings
+from app.core.db import IngestSessionLocal, ingest_engine
+from app.core.leader import check_leadership
+from app.core.metrics import EMBEDDING_MIGRATION_CHUNKS
+from app.models.document import EmbeddingMigration, CatalogDocument
+from app.services import embeddings as embeddings_service
+from typing import Optional, Tuple
+import numpy as np
+import asyncio
+import logging
+import re
+import time
+
+logger = logging.getLogger(__name__)
+
+# Migrations that still have work to do; at most one exists at a time
+ACTIVE_STATUSES = ("pending", "backfilling", "indexing")
+
+# Per-process cache of the active model: (expires_at, (model, dimensions))
+_active_model: Optional[Tuple[float, Tuple[str, int]]] = None
+
+async def load_active_embedding_model(db: AsyncSession) -> Tuple[str, int]:
+    """Model and dimensions of the newest completed migration, else the configured model."""
+    row = (await db.execute(
+        select(EmbeddingMigration.target_model, EmbeddingMigration.target_dimensions)
+        .where(EmbeddingMigration.status == "done")
+        .order_by(EmbeddingMigration.finished_at.desc())
+        .limit(1)
+    )).first()
+    if row is None:
+        return settings.embedding_model, settings.embedding_dimensions
+    return row[0], row[1]
+
+async def get_active_embedding_model(db: AsyncSession) -> Tuple[str, int]:
+    """
+    The model the stored embeddings were made with, which ingestion must
+    embed with too. Cached for EMBEDDING_MODEL_CACHE_TTL seconds, so other
+    processes follow a cutover within that window; store_chunks() re-checks
+    it before writing, and queries read it uncached.
+    """
+    global _active_model
+    now = time.monotonic()
+    if _active_model and _active_model[0] > now:
+        return _active_model[1]
+    value = await load_active_embedding_model(db)
+    _active_model = (now + settings.embedding_model_cache_ttl, value)
+    return value
+
+def invalidate_active_embedding_model():
+    global _active_model
+    _active_model = None
+
+async def get_latest_migration(db: AsyncSession) -> Optional[EmbeddingMigration]:
+    result = await db.execute(select(EmbeddingMigration).order_by(EmbeddingMigration.id.desc()).limit(1))
+    return result.scalar_one_or_none()
+
+async def get_active_migration(db: AsyncSession) -> Optional[EmbeddingMigration]:
+    result = await db.execute(
+        select(EmbeddingMigration).where(EmbeddingMigration.status.in_(ACTIVE_STATUSES))
+    )
+    return result.scalar_one_or_none()
+
+async def start_migration(db: AsyncSession, target_model: str, dimensions: int) -> EmbeddingMigration:
+    """Queue a re-embedding into target_model; the leader picks it up on its next poll."""
+    source_model, _ = await load_active_embedding_model(db)
+    migration = EmbeddingMigration(
+        source_model=source_model,
+        target_model=target_model,
+        target_dimensions=dimensions,
+        status="pending"
+    )
+    db.add(migration)
+    try:
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        raise ValueError("Another embedding migration is already in progress")
+    return migration
+
+async def cancel_migration(db: AsyncSession) -> bool:
+    """Cancel the active migration; the old embeddings keep serving. Returns False if none was active."""
+    result = await db.execute(
+        update(EmbeddingMigration)
+        .where(EmbeddingMigration.status.in_(ACTIVE_STATUSES))
+        .values(status="cancelled", finished_at=func.now(), updated_at=func.now())
+    )
+    await db.commit()
+    return result.rowcount > 0
+
+def describe_migration(migration: EmbeddingMigration) -> dict:
+    """Progress summary with average throughput and a rough ETA."""
+    info = {
+        "id": migration.id,
+        "status": migration.status,
+        "source_model": migration.source_model,
+        "target_model": migration.target_model,
+        "target_dimensions": migration.target_dimensions,
+        "processed": migration.processed,
+        "total": migration.total,
+        "error": migration.error
+    }
+    if migration.started_at and migration.updated_at and migration.processed:
+        elapsed = (migration.updated_at - migration.started_at).total_seconds()
+        if elapsed > 0:
+            rate = migration.processed / elapsed
+            info["chunks_per_s"] = round(rate, 2)
+            if migration.total and migration.status == "backfilling":
+                info["eta_s"] = round(max(0, migration.total - migration.processed) / rate)
+    return info
+
+async def run_worker():
+    """
+    Leader-only loop: run the queued or interrupted migration, if any.
+    Progress is committed with every batch, so a new leader resumes where
+    the previous one stopped.
+    """
+    while True:
+        try:
+            async with IngestSessionLocal() as db:
+                migration = await get_active_migration(db)
+            if migration is not None:
+                await run_migration(migration.id)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Embedding migration interrupted, will resume: {str(e)[:200]}")
+        await asyncio.sleep(settings.reembed_poll_interval)
+
+async def run_migration(migration_id: int):
+    """Take a migration through backfill, index build and cutover, from wherever it stopped."""
+    async with IngestSessionLocal() as db:
+        migration = await db.get(EmbeddingMigration, migration_id)
+        if migration is None:
+            return
+        # Progress is tracked on this copy; rollbacks must not expire it
+        db.expunge(migration)
+        try:
+            if migration.status == "pending":
+                await _prepare(db, migration)
+            if migration.status == "backfilling":
+                await _backfill(db, migration)
+            if migration.status == "indexing":
+                await _build_index()
+                await _catch_up(db, migration)
+                await _cut_over(db, migration)
+        except Exception as e:
+            await db.rollback()
+            await db.execute(
+                update(EmbeddingMigration)
+                .where(EmbeddingMigration.id == migration_id)
+                .values(error=str(e)[:1000], updated_at=func.now())
+            )
+            await db.commit()
+            raise
+
+async def _prepare(db: AsyncSession, migration: EmbeddingMigration):
+    """Add an empty embedding_next column sized for the target model."""
+    logger.info(f"🔄 Starting re-embedding {migration.source_model} -> {migration.target_model}")
+    dimensions = int(migration.target_dimensions)
+    # Adding a nullable column is a catalog-only change, but it still needs
+    # a brief exclusive lock; don't queue behind long-running queries
+    await db.execute(text("SET LOCAL lock_timeout = '5s'"))
+    # Leftovers of a cancelled or failed run
+    await db.execute(text("ALTER TABLE document_chunks DROP COLUMN IF EXISTS embedding_next"))
+    await db.execute(text(f"ALTER TABLE document_chunks ADD COLUMN embedding_next vector({dimensions})"))
+    total = (await db.execute(text("SELECT COUNT(*) FROM document_chunks"))).scalar()
+    await db.execute(
+        update(EmbeddingMigration)
+        .where(EmbeddingMigration.id == migration.id, EmbeddingMigration.status == "pending")
+        .values(status="backfilling", total=total, started_at=func.now(), updated_at=func.now())
+        .execution_options(synchronize_session=False)
+    )
+    await check_leadership(db)
+    await db.commit()
+    migration.status, migration.total = "backfilling", total
+
+async def _embed_rows(db: AsyncSession, migration: EmbeddingMigration, rows) -> bool:
+    """
+    Embed rows' content with the target model into embedding_next and
+    record progress in the same transaction. Returns False if the
+    migration was cancelled meanwhile (nothing is written then). Raises
+    if this process lost leadership, so the caller's commit never runs.
+    """
+    vectors = await embeddings_service.embed_documents(
+        [row.content for row in rows],
+        out=np.empty((len(rows), migration.target_dimensions), dtype=np.float32),
+        model=migration.target_model
+    )
+    await db.execute(
+        text("UPDATE document_chunks SET embedding_next = CAST(:embedding AS vector) WHERE id = :id"),
+        [{"id": row.id, "embedding": vector} for row, vector in zip(rows, vectors)]
+    )
+    result = await db.execute(
+        update(EmbeddingMigration)
+        .where(EmbeddingMigration.id == migration.id, EmbeddingMigration.status == migration.status)
+        .values(
+            last_chunk_id=func.greatest(EmbeddingMigration.last_chunk_id, rows[-1].id),
+            processed=EmbeddingMigration.processed + len(rows),
+            updated_at=func.now()
+        )
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount == 0:
+        await db.rollback()
+        migration.status = "cancelled"
+        logger.info(f"Embedding migration {migration.id} was cancelled")
+        return False
+    await check_leadership(db)
+    migration.last_chunk_id = max(migration.last_chunk_id, rows[-1].id)
+    migration.processed += len(rows)
+    EMBEDDING_MIGRATION_CHUNKS.labels(state="processed").set(migration.processed)
+    return True
+
+async def _backfill(db: AsyncSession, migration: EmbeddingMigration):
+    """Embed every chunk from stored content, in id order, in throttled batches."""
+    EMBEDDING_MIGRATION_CHUNKS.labels(state="total").set(migration.total or 0)
+    run_started, run_processed, last_report = time.monotonic(), 0, 0.0
+    while True:
+        # Keyset pagination: resumable from last_chunk_id and never rescans;
+        # chunks (re-)ingested meanwhile get higher ids and are reached too
+        rows = (await db.execute(
+            text("SELECT id, content FROM document_chunks WHERE id > :last ORDER BY id LIMIT :batch"),
+            {"last": migration.last_chunk_id, "batch": settings.reembed_batch_size}
+        )).all()
+        if not rows:
+            break
+        if not await _embed_rows(db, migration, rows):
+            return
+        await db.commit()
+
+        run_processed += len(rows)
+        now = time.monotonic()
+        if now - last_report >= 10:
+            last_report = now
+            rate = run_processed / (now - run_started)
+            logger.info(
+                f"Re-embedding {migration.processed}/{migration.total} chunks "
+                f"({rate:.1f} chunks/s) into {migration.target_model}"
+            )
+        await asyncio.sleep(settings.reembed_pause)
+
+    await db.execute(
+        update(EmbeddingMigration)
+        .where(EmbeddingMigration.id == migration.id, EmbeddingMigration.status == "backfilling")
+        .values(status="indexing", updated_at=func.now())
+        .execution_options(synchronize_session=False)
+    )
+    await check_leadership(db)
+    await db.commit()
+    migration.status = "indexing"
+    logger.info(f"✓ Backfill complete ({migration.processed} chunks), building index")
+
+async def _column_indexes(db, column: str):
+    """(name, definition) of every document_chunks index using column, in its keys or WHERE clause."""
+    rows = (await db.execute(text("""
+        SELECT c.relname, pg_get_indexdef(i.indexrelid)
+        FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+        WHERE i.indrelid = 'document_chunks'::regclass
+        ORDER BY c.relname
+    """))).all()
+    pattern = re.compile(rf"\b{column}\b")
+    return [(name, definition) for name, definition in rows if pattern.search(definition.split(" USING ", 1)[-1])]
+
+def _next_index_name(name: str) -> str:
+    """Name of an embedding index's twin on embedding_next (renamed back at cutover)."""
+    return "embedding_next_idx" if name == "embedding_idx" else f"{name}_next"
+
+async def _build_index():
+    """
+    Build ANN indexes on embedding_next without blocking reads or writes:
+    a twin of every index on embedding (including partial, per-group ones),
+    since dropping the old column at cutover drops those indexes with it.
+    """
+    async with ingest_engine.connect() as conn:
+        # CREATE INDEX CONCURRENTLY cannot run inside a transaction block
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        twins = {
+            _next_index_name(name): re.sub(r"\bembedding\b", "embedding_next", definition)
+            for name, definition in await _column_indexes(conn, "embedding")
+        }
+        twins.setdefault("embedding_next_idx", """
+            CREATE INDEX embedding_next_idx ON document_chunks
+            USING ivfflat (embedding_next vector_cosine_ops)
+            WITH (lists = 100)
+        """)
+        for name, definition in twins.items():
+            valid = (await conn.execute(
+                text("SELECT indisvalid FROM pg_index WHERE indexrelid = to_regclass(:name)"),
+                {"name": f'"{name}"'}
+            )).scalar()
+            if valid:
+                continue
+            # An interrupted concurrent build leaves an invalid index behind
+            await conn.execute(text(f'DROP INDEX CONCURRENTLY IF EXISTS "{name}"'))
+            definition = re.sub(
+                r"^\s*CREATE (UNIQUE )?INDEX \S+ ON",
+                lambda m: f'CREATE {m.group(1) or ""}INDEX CONCURRENTLY "{name}" ON',
+                definition
+            )
+            logger.info(f"Building index {name} on embedding_next")
+            # Run verbatim: a copied WHERE clause may hold literals that look like bind parameters
+            await conn.exec_driver_sql(definition)
+
+async def _select_missing(db: AsyncSession):
+    return (await db.execute(
+        text("SELECT id, content FROM document_chunks WHERE embedding_next IS NULL ORDER BY id LIMIT :batch"),
+        {"batch": settings.reembed_batch_size}
+    )).all()
+
+async def _catch_up(db: AsyncSession, migration: EmbeddingMigration):
+    """
+    Embed chunks ingested since the backfill passed them, until none are
+    left, so the cutover only has to handle the ones written in between.
+    """
+    while rows := await _select_missing(db):
+        if not await _embed_rows(db, migration, rows):
+            return
+        await db.commit()
+        if len(rows) == settings.reembed_batch_size:
+            await asyncio.sleep(settings.reembed_pause)
+
+async def _cut_over(db: AsyncSession, migration: EmbeddingMigration):
+    """
+    Swap embedding_next in for embedding in one transaction. Catch-up has
+    embedded everything up to just before the lock; writers are held off
+    only while chunks written since then are embedded, and readers only
+    wait for the column swap itself.
+    """
+    if migration.status != "indexing":
+        return  # Cancelled during catch-up
+    await db.execute(text("SET LOCAL lock_timeout = '5s'"))
+    await db.execute(text("LOCK TABLE document_chunks IN SHARE ROW EXCLUSIVE MODE"))
+    while rows := await _select_missing(db):
+        if not await _embed_rows(db, migration, rows):
+            return
+    twins = [name for name, _ in await _column_indexes(db, "embedding_next")]
+    # Drops the old column's indexes; their twins take over their names
+    await db.execute(text("ALTER TABLE document_chunks DROP COLUMN embedding"))
+    await db.execute(text("ALTER TABLE document_chunks RENAME COLUMN embedding_next TO embedding"))
+    for name in twins:
+        original = "embedding_idx" if name == "embedding_next_idx" else name.removesuffix("_next")
+        await db.execute(text(f'ALTER INDEX "{name}" RENAME TO "{original}"'))
+    await db.execute(update(CatalogDocument).values(embedding_model=migration.target_model))
+    result = await db.execute(
+        update(EmbeddingMigration)
+        .where(EmbeddingMigration.id == migration.id, EmbeddingMigration.status == "indexing")
+        .values(status="done", error=None, finished_at=func.now(), updated_at=func.now())
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount == 0:
+        await db.rollback()
+        migration.status = "cancelled"
+        return
+    await check_leadership(db)
+    await db.commit()
+    migration.status = "done"
+    invalidate_active_embedding_model()
+    logger.info(f"✅ Cut over to {migration.target_model} ({migration.processed} chunks re-embedded)")
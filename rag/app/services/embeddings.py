@@ -0,0 +1,55 @@
+from app.core.config import settings
+from typing import List, Optional
+import numpy as np
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Lazy initialization - the ollama client is created on first use
+_client = None
+
+def get_client():
+    """Get or create the Ollama async client (singleton)."""
+    global _client
+    if _client is None:
+        from ollama import AsyncClient
+        _client = AsyncClient(host=settings.ollama_base_url)
+    return _client
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    """L2-normalise rows in place (zero rows are left as zeros). Returns the same array."""
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    np.divide(vectors, norms, out=vectors, where=norms > 0)
+    return vectors
+
+async def embed_documents(texts: List[str], out: Optional[np.ndarray] = None, model: Optional[str] = None) -> np.ndarray:
+    """
+    Embed a batch of texts into a (len(texts), dimensions) float32 array,
+    written into `out` when given (e.g. a slice of a preallocated array,
+    whose shape must match the model's dimensions).
+    The decoded JSON lists only live until they are copied into the array.
+    Raises ValueError if the model returns a different number of dimensions.
+    """
+    model = model or settings.embedding_model
+    response = await get_client().embed(model=model, input=texts)
+    if out is None:
+        out = np.asarray(response.embeddings, dtype=np.float32)
+    else:
+        width = len(response.embeddings[0]) if response.embeddings else 0
+        if width != out.shape[-1]:
+            raise ValueError(
+                f"Embedding model {model} returned {width} dimensions, expected {out.shape[-1]} "
+                f"(check EMBEDDING_DIMENSIONS)"
+            )
+        out[:] = response.embeddings
+    del response
+    return normalize(out)
+
+async def probe_dimensions(model: str) -> int:
+    """Number of dimensions a model's embeddings have."""
+    response = await get_client().embed(model=model, input=["dimension probe"])
+    return len(response.embeddings[0])
+
+async def embed_query(text: str, model: Optional[str] = None) -> np.ndarray:
+    """Embed a single query into a 1-D float32 array."""
+    return (await embed_documents([text], model=model))[0]
@@ -1,19 +1,13 @@
-from langchain_ollama import OllamaEmbeddings
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_community.document_loaders import (
-    PyPDFLoader,
-    Docx2txtLoader,
-    UnstructuredMarkdownLoader,
-    TextLoader,
-    CSVLoader,
-    UnstructuredExcelLoader,
-    UnstructuredPowerPointLoader,
-    UnstructuredHTMLLoader
-)
+from langchain_core.documents import Document
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, delete
-from app.models.document import DocumentChunk
+from sqlalchemy import select, delete, func
+from sqlalchemy.dialects.postgresql import insert
+from app.models.document import DocumentChunk, CatalogDocument
 from app.core.config import settings
+from app.core.leader import check_leadership
+from app.core.metrics import observe_ingest_stage
+from app.services import embeddings as embeddings_service, parse_cache
+from app.services.embedding_migration import get_active_embedding_model, load_active_embedding_model
 import logging
 from pathlib import Path
 import uuid
@@ -22,39 +16,50 @@ from io import BytesIO
 import asyncio
 import tempfile
 import os
+import importlib
+import hashlib
+import time
+import json
+import numpy as np
+from typing import List, Dict, Optional
 
 logger = logging.getLogger(__name__)
 
 # Lazy initialization - create only when needed
 _text_splitter = None
-_embeddings_model = None
 
 # Configuration for optimal accuracy
-CHUNK_SIZE = 1000  # Characters per chunk
-CHUNK_OVERLAP = 200  # Overlap between chunks for context continuity
+CHUNK_SIZE = settings.chunk_size  # Characters per chunk
+CHUNK_OVERLAP = settings.chunk_overlap  # Overlap between chunks for context continuity
 BATCH_SIZE = 200  # Process embeddings in batches
 MAX_RETRIES = 3  # Retry failed batches
 
-# Document loader mapping for different file types
+# Document loader registry for different file types ("module:Class").
+# Loaders are imported on first use so query-only workers never pull in
+# unstructured and friends.
 LOADER_MAPPING = {
-    '.pdf': PyPDFLoader,
-    '.docx': Docx2txtLoader,
-    '.doc': Docx2txtLoader,
-    '.md': UnstructuredMarkdownLoader,
-    '.txt': TextLoader,
-    '.csv': CSVLoader,
-    '.xlsx': UnstructuredExcelLoader,
-    '.xls': UnstructuredExcelLoader,
-    '.pptx': UnstructuredPowerPointLoader,
-    '.ppt': UnstructuredPowerPointLoader,
-    '.html': UnstructuredHTMLLoader,
-    '.htm': UnstructuredHTMLLoader
+    '.pdf': "langchain_community.document_loaders.pdf:PyPDFLoader",
+    '.docx': "langchain_community.document_loaders.word_document:Docx2txtLoader",
+    '.doc': "langchain_community.document_loaders.word_document:Docx2txtLoader",
+    '.md': "langchain_community.document_loaders.markdown:UnstructuredMarkdownLoader",
+    '.txt': "langchain_community.document_loaders.text:TextLoader",
+    '.csv': "langchain_community.document_loaders.csv_loader:CSVLoader",
+    '.xlsx': "langchain_community.document_loaders.excel:UnstructuredExcelLoader",
+    '.xls': "langchain_community.document_loaders.excel:UnstructuredExcelLoader",
+    '.pptx': "langchain_community.document_loaders.powerpoint:UnstructuredPowerPointLoader",
+    '.ppt': "langchain_community.document_loaders.powerpoint:UnstructuredPowerPointLoader",
+    '.html': "langchain_community.document_loaders.html:UnstructuredHTMLLoader",
+    '.htm': "langchain_community.document_loaders.html:UnstructuredHTMLLoader"
 }
 
+# Resolved loader classes, keyed by "module:Class"
+_loader_classes: Dict[str, type] = {}
+
 def get_text_splitter():
     """Lazy load text splitter with recursive character splitting."""
     global _text_splitter
     if _text_splitter is None:
+        from langchain_text_splitters import RecursiveCharacterTextSplitter
         _text_splitter = RecursiveCharacterTextSplitter(
             chunk_size=CHUNK_SIZE,
             chunk_overlap=CHUNK_OVERLAP,
@@ -64,108 +69,113 @@ def get_text_splitter():
         )
     return _text_splitter
 
-def get_embeddings_model():
-    """Lazy load embeddings model (singleton)."""
-    global _embeddings_model
-    if _embeddings_model is None:
-        _embeddings_model = OllamaEmbeddings(
-            model=settings.embedding_model,
-            base_url=settings.ollama_base_url
-        )
-    return _embeddings_model
+def get_loader_class(file_extension: str) -> type:
+    """Resolve (and import on first use) the loader class registered for an extension."""
+    loader_path = LOADER_MAPPING.get(file_extension.lower())
+    if not loader_path:
+        raise ValueError(f"Unsupported file type: {file_extension}")
+    if loader_path not in _loader_classes:
+        module_name, class_name = loader_path.split(":")
+        _loader_classes[loader_path] = getattr(importlib.import_module(module_name), class_name)
+    return _loader_classes[loader_path]
 
 def get_document_loader(file_path: str, file_extension: str):
     """Get appropriate LangChain document loader based on file type."""
-    loader_class = LOADER_MAPPING.get(file_extension.lower())
-    if not loader_class:
-        raise ValueError(f"Unsupported file type: {file_extension}")
-    return loader_class(file_path)
+    return get_loader_class(file_extension)(file_path)
 
-async def ingest_file(
-    db: AsyncSession,
-    file_bytes: bytes,
-    doc_id: str,
-    filename: str,
-    save_file: bool = True  # ← Option to save file
-) -> int:
+def load_documents(file_path: str, file_extension: str, file_hash: Optional[str] = None) -> List[Document]:
     """
-    Parse document with LangChain loaders, chunk it, create embeddings, and store in DB.
-    Uses optimized LangChain document loaders for better RAG performance.
-    Optionally saves the original file to disk.
+    Parse a file into LangChain documents using the loader for its type.
+    With a file_hash, the parsed-text cache is consulted first and filled
+    on a miss.
     """
-    temp_file_path = None
-    try:
-        # Get file extension
-        file_extension = Path(filename).suffix.lower()
-
-        # Create temporary file for LangChain loaders (they need file paths)
-        with tempfile.NamedTemporaryFile(delete=False, suffix=file_extension) as temp_file:
-            temp_file.write(file_bytes)
-            temp_file_path = temp_file.name
-
-        # Optionally save file to uploads folder
-        if save_file:
-            timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-            file_path = settings.upload_dir / f"{timestamp}_{doc_id}_{filename}"
-            file_path.write_bytes(file_bytes)
-            logger.info(f"Saved file to {file_path}")
-
-        # Delete existing chunks for this doc_id
-        await db.execute(
-            delete(DocumentChunk).where(DocumentChunk.doc_id == doc_id)
-        )
-        await db.commit()
-
-        # Load document using appropriate LangChain loader
-        logger.info(f"Loading document with LangChain: {filename}")
-        loader = get_document_loader(temp_file_path, file_extension)
+    loader_path = LOADER_MAPPING.get(file_extension.lower())
+    use_cache = bool(file_hash and loader_path and settings.parse_cache_enabled)
+    if use_cache:
+        documents = parse_cache.get(file_hash, loader_path)
+        if documents:
+            logger.info(f"Loaded {len(documents)} document(s) from parse cache")
+            return documents
+
+    logger.info(f"Loading document with LangChain: {Path(file_path).name}")
+    loader = get_document_loader(file_path, file_extension)
+    with observe_ingest_stage("parse"):
         documents = loader.load()
 
-        if not documents:
-            raise ValueError("No content extracted from document")
+    if not documents:
+        raise ValueError("No content extracted from document")
+
+    if use_cache:
+        try:
+            parse_cache.put(file_hash, loader_path, documents)
+        except Exception as e:
+            logger.warning(f"Failed to write parse cache: {e}")
 
-        logger.info(f"Loaded {len(documents)} document(s)")
+    logger.info(f"Loaded {len(documents)} document(s)")
+    return documents
 
-        # Extract text from LangChain documents
-        full_text = "\n\n".join([doc.page_content for doc in documents])
+def split_documents(documents: List[Document]) -> List[str]:
+    """Join loaded documents and split the text into overlapping chunks."""
+    # Extract text from LangChain documents
+    full_text = "\n\n".join([doc.page_content for doc in documents])
 
-        if not full_text or not full_text.strip():
-            raise ValueError("No text extracted from document")
+    if not full_text or not full_text.strip():
+        raise ValueError("No text extracted from document")
 
-        # Split text into chunks using RecursiveCharacterTextSplitter
-        logger.info(f"Splitting text into chunks (size={CHUNK_SIZE}, overlap={CHUNK_OVERLAP})")
-        text_splitter = get_text_splitter()
+    # Split text into chunks using RecursiveCharacterTextSplitter
+    logger.info(f"Splitting text into chunks (size={CHUNK_SIZE}, overlap={CHUNK_OVERLAP})")
+    text_splitter = get_text_splitter()
 
-        # Use split_documents for better metadata preservation
+    with observe_ingest_stage("split"):
         text_documents = text_splitter.create_documents([full_text])
         chunk_texts = [doc.page_content for doc in text_documents]
 
-        if not chunk_texts:
-            raise ValueError("No chunks generated from document")
+    if not chunk_texts:
+        raise ValueError("No chunks generated from document")
+
+    logger.info(f"Generated {len(chunk_texts)} chunks")
+    return chunk_texts
 
-        logger.info(f"Generated {len(chunk_texts)} chunks")
+async def embed_chunks(
+    chunk_texts: List[str],
+    model: Optional[str] = None,
+    dimensions: Optional[int] = None
+) -> np.ndarray:
+    """
+    Create embeddings in batches, retrying failed batches and falling back to per-chunk calls.
+    Returns a (chunks, dimensions) float32 array; each batch is decoded straight
+    into its rows, and chunks that fail entirely are left as zero vectors.
+    Raises ValueError on a dimension mismatch or if every chunk failed.
+    """
+    if not chunk_texts:
+        raise ValueError("No embeddings could be created")
 
-        # Create embeddings in batches for efficiency
-        logger.info(f"Creating embeddings for {len(chunk_texts)} chunks (batch_size={BATCH_SIZE})")
-        embeddings = []
-        embeddings_model = get_embeddings_model()
+    model = model or settings.embedding_model
+    dimensions = dimensions or settings.embedding_dimensions
+    logger.info(f"Creating embeddings for {len(chunk_texts)} chunks (batch_size={BATCH_SIZE})")
+    embeddings = np.zeros((len(chunk_texts), dimensions), dtype=np.float32)
+    failed_chunks = 0
 
-        # Process in batches
-        for batch_start in range(0, len(chunk_texts), BATCH_SIZE):
-            batch_end = min(batch_start + BATCH_SIZE, len(chunk_texts))
-            batch_texts = chunk_texts[batch_start:batch_end]
+    # Process in batches
+    for batch_start in range(0, len(chunk_texts), BATCH_SIZE):
+        batch_end = min(batch_start + BATCH_SIZE, len(chunk_texts))
+        batch_texts = chunk_texts[batch_start:batch_end]
 
-            logger.info(f"Processing batch {batch_start//BATCH_SIZE + 1}/{(len(chunk_texts) + BATCH_SIZE - 1)//BATCH_SIZE} (chunks {batch_start+1}-{batch_end})")
+        logger.info(f"Processing batch {batch_start//BATCH_SIZE + 1}/{(len(chunk_texts) + BATCH_SIZE - 1)//BATCH_SIZE} (chunks {batch_start+1}-{batch_end})")
 
+        with observe_ingest_stage("embed_batch"):
             # Retry logic for batch processing
             for attempt in range(MAX_RETRIES):
                 try:
-                    # Batch embedding using aembed_documents
-                    batch_embeddings = await embeddings_model.aembed_documents(batch_texts)
-                    embeddings.extend(batch_embeddings)
-                    logger.info(f"✓ Batch {batch_start//BATCH_SIZE + 1} completed ({len(batch_embeddings)} embeddings)")
+                    await embeddings_service.embed_documents(
+                        batch_texts, out=embeddings[batch_start:batch_end], model=model
+                    )
+                    logger.info(f"✓ Batch {batch_start//BATCH_SIZE + 1} completed ({len(batch_texts)} embeddings)")
                     break  # Success, exit retry loop
 
+                except ValueError:
+                    raise  # Wrong dimensions: retrying or going chunk by chunk cannot help
+
                 except Exception as e:
                     if attempt < MAX_RETRIES - 1:
                         logger.warning(f"Batch failed (attempt {attempt + 1}/{MAX_RETRIES}): {str(e)[:100]}")
@@ -176,50 +186,168 @@ async def ingest_file(
                         logger.error(f"Batch failed after {MAX_RETRIES} attempts, processing individually...")
                         for idx, text in enumerate(batch_texts):
                             try:
-                                embedding = await embeddings_model.aembed_query(text)
-                                embeddings.append(embedding)
+                                await embeddings_service.embed_documents(
+                                    [text], out=embeddings[batch_start + idx:batch_start + idx + 1], model=model
+                                )
+                            except ValueError:
+                                raise
                             except Exception as ind_e:
+                                # Row stays a zero vector as placeholder for the failed chunk
+                                failed_chunks += 1
                                 logger.warning(f"Chunk {batch_start + idx + 1} failed: {str(ind_e)[:50]}")
-                                # Create zero embedding as placeholder for failed chunk
-                                embeddings.append([0.0] * 768)
 
-        if not embeddings:
-            raise ValueError("No embeddings could be created")
+    if failed_chunks == len(chunk_texts):
+        raise ValueError("No embeddings could be created")
 
-        logger.info(f"Created {len(embeddings)} embeddings for {len(chunk_texts)} chunks")
+    logger.info(f"Created {len(embeddings) - failed_chunks} embeddings for {len(chunk_texts)} chunks")
+    return embeddings
 
-        # Store chunks in database
-        logger.info(f"Storing {len(embeddings)} chunks in database")
-        db_chunks = []
+# Columns written by COPY; id, created_at and the generated content_tsv fill themselves
+CHUNK_COPY_COLUMNS = ["doc_id", "chunk_id", "content", "embedding", "chunk_metadata"]
 
-        for idx, (chunk_text, embedding) in enumerate(zip(chunk_texts, embeddings)):
-            try:
-                chunk_metadata = {
-                    "filename": filename,
-                    "chunk_index": idx,
-                    "chunk_size": len(chunk_text)
-                }
-                db_chunk = DocumentChunk(
-                    doc_id=doc_id,
-                    chunk_id=idx,
-                    content=chunk_text,
-                    embedding=embedding,
-                    chunk_metadata=chunk_metadata
-                )
-                db_chunks.append(db_chunk)
-            except Exception as e:
-                logger.warning(f"Failed to prepare chunk {idx}: {e}")
-                continue
-
-        # Bulk insert for better performance
-        if db_chunks:
-            db.add_all(db_chunks)
-            await db.commit()
-            logger.info(f"Successfully ingested {len(db_chunks)}/{len(chunk_texts)} chunks")
-            return len(db_chunks)
-        else:
-            logger.error("No chunks to store")
-            return 0
+async def copy_chunk_records(db: AsyncSession, records) -> None:
+    """
+    Bulk load (doc_id, chunk_id, content, embedding, chunk_metadata json)
+    records into document_chunks with binary COPY, inside the session's
+    current transaction. Embeddings go over the wire as binary pgvector
+    straight from their float32 arrays.
+    """
+    conn = await db.connection()
+    raw = await conn.get_raw_connection()
+    await raw.driver_connection.copy_records_to_table(
+        DocumentChunk.__tablename__,
+        records=records,
+        columns=CHUNK_COPY_COLUMNS
+    )
+
+async def store_chunks(
+    db: AsyncSession,
+    doc_id: str,
+    filename: str,
+    chunk_texts: List[str],
+    embeddings: np.ndarray,
+    file_hash: Optional[str] = None,
+    size_bytes: Optional[int] = None,
+    started_at: Optional[float] = None,
+    embedding_model: Optional[str] = None
+) -> int:
+    """
+    Replace a document's chunks: delete the old ones and bulk insert the new
+    ones in a single transaction, so readers see either version but never
+    an empty document. The document catalog row is updated in the same
+    transaction. Returns chunks stored.
+    With embedding_model, the write is refused if an online re-embedding
+    has cut over to a different model since the chunks were embedded.
+    """
+    if not chunk_texts:
+        logger.error("No chunks to store")
+        return 0
+
+    logger.info(f"Storing {len(embeddings)} chunks in database")
+    records = (
+        (
+            doc_id,
+            idx,
+            chunk_text,
+            embedding,
+            json.dumps({
+                "filename": filename,
+                "chunk_index": idx,
+                "chunk_size": len(chunk_text)
+            })
+        )
+        for idx, (chunk_text, embedding) in enumerate(zip(chunk_texts, embeddings))
+    )
+    chunk_count = min(len(chunk_texts), len(embeddings))
+
+    with observe_ingest_stage("db_write"):
+        await db.execute(
+            delete(DocumentChunk).where(DocumentChunk.doc_id == doc_id)
+        )
+        # The delete's table lock orders this write against a cutover, so the
+        # model read here is the one the rows will be stored under
+        if embedding_model and (await load_active_embedding_model(db))[0] != embedding_model:
+            raise ValueError(f"Embedding model changed from {embedding_model} during ingestion; retry")
+        await copy_chunk_records(db, records)
+        duration_ms = int((time.perf_counter() - started_at) * 1000) if started_at else None
+        await db.execute(catalog_upsert(
+            doc_id, filename, chunk_count, file_hash, size_bytes, duration_ms, embedding_model
+        ))
+        await check_leadership(db)
+        await db.commit()
+    logger.info(f"Successfully ingested {chunk_count}/{len(chunk_texts)} chunks")
+    return chunk_count
+
+def catalog_upsert(
+    doc_id: str,
+    filename: str,
+    chunk_count: int,
+    file_hash: Optional[str],
+    size_bytes: Optional[int],
+    duration_ms: Optional[int],
+    embedding_model: Optional[str] = None
+):
+    """INSERT ... ON CONFLICT statement recording a document in the catalog."""
+    values = {
+        "filename": filename,
+        "chunk_count": chunk_count,
+        "size_bytes": size_bytes,
+        "file_hash": file_hash,
+        "ingest_duration_ms": duration_ms,
+        "embedding_model": embedding_model or settings.embedding_model,
+        "updated_at": func.now()
+    }
+    return insert(CatalogDocument).values(doc_id=doc_id, **values).on_conflict_do_update(
+        index_elements=[CatalogDocument.doc_id],
+        set_=values
+    )
+
+async def ingest_file(
+    db: AsyncSession,
+    file_bytes: bytes,
+    doc_id: str,
+    filename: str,
+    save_file: bool = True  # ← Option to save file
+) -> int:
+    """
+    Parse document with LangChain loaders, chunk it, create embeddings, and store in DB.
+    Uses optimized LangChain document loaders for better RAG performance.
+    Optionally saves the original file to disk.
+    """
+    temp_file_path = None
+    started_at = time.perf_counter()
+    file_hash = hashlib.sha256(file_bytes).hexdigest()
+    try:
+        # Get file extension
+        file_extension = Path(filename).suffix.lower()
+
+        # Create temporary file for LangChain loaders (they need file paths)
+        with tempfile.NamedTemporaryFile(delete=False, suffix=file_extension) as temp_file:
+            temp_file.write(file_bytes)
+            temp_file_path = temp_file.name
+
+        # Optionally save file to uploads folder
+        if save_file:
+            timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+            file_path = settings.upload_dir / f"{timestamp}_{doc_id}_{filename}"
+            file_path.write_bytes(file_bytes)
+            logger.info(f"Saved file to {file_path}")
+
+        # Parsing and splitting are CPU-bound; run them off the event loop
+        # so queries keep being served while documents ingest
+        documents = await asyncio.to_thread(load_documents, temp_file_path, file_extension, file_hash)
+        chunk_texts = await asyncio.to_thread(split_documents, documents)
+        model, dimensions = await get_active_embedding_model(db)
+        # End the lookup's transaction instead of idling in it while Ollama embeds
+        await db.commit()
+        embeddings = await embed_chunks(chunk_texts, model, dimensions)
+        return await store_chunks(
+            db, doc_id, filename, chunk_texts, embeddings,
+            file_hash=file_hash,
+            size_bytes=len(file_bytes),
+            started_at=started_at,
+            embedding_model=model
+        )
 
     except Exception as e:
         await db.rollback()
@@ -0,0 +1,132 @@
+from langchain_core.documents import Document
+from importlib import metadata
+from pathlib import Path
+from typing import List, Optional
+from app.core.config import settings
+from app.core.metrics import PARSE_CACHE_REQUESTS
+import gzip
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+
+logger = logging.getLogger(__name__)
+
+# Bump to invalidate every cached parse (e.g. when load_documents post-processing changes)
+PARSE_CACHE_VERSION = 1
+
+# Library that does the actual extraction for each loader; its version is part of the key
+LOADER_BACKENDS = {
+    "PyPDFLoader": "pypdf",
+    "Docx2txtLoader": "docx2txt",
+    "TextLoader": None,
+    "CSVLoader": None,
+}
+
+def _dist_version(name: str) -> str:
+    try:
+        return metadata.version(name)
+    except metadata.PackageNotFoundError:
+        return "none"
+
+def loader_version(loader_path: str) -> str:
+    """Short hash over everything that can change a loader's output."""
+    class_name = loader_path.split(":")[-1]
+    backend = LOADER_BACKENDS.get(class_name, "unstructured")
+    parts = [
+        str(PARSE_CACHE_VERSION),
+        loader_path,
+        _dist_version("langchain-community"),
+        f"{backend}={_dist_version(backend)}" if backend else ""
+    ]
+    return hashlib.sha256("|".join(parts).encode()).hexdigest()[:12]
+
+def cache_path(file_hash: str, loader_path: str) -> Path:
+    class_name = loader_path.split(":")[-1]
+    return Path(settings.parse_cache_dir) / file_hash[:2] / f"{file_hash}-{class_name}-{loader_version(loader_path)}.json.gz"
+
+def get(file_hash: str, loader_path: str) -> Optional[List[Document]]:
+    """Cached documents for (file content, loader, loader version), or None."""
+    path = cache_path(file_hash, loader_path)
+    try:
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            payload = json.load(f)
+    except FileNotFoundError:
+        PARSE_CACHE_REQUESTS.labels(outcome="miss").inc()
+        return None
+    except (OSError, ValueError) as e:
+        logger.warning(f"Ignoring corrupt parse cache entry {path.name}: {e}")
+        PARSE_CACHE_REQUESTS.labels(outcome="miss").inc()
+        return None
+
+    PARSE_CACHE_REQUESTS.labels(outcome="hit").inc()
+    try:
+        os.utime(path)  # mtime = last use, for prune()
+    except OSError:
+        pass
+    return [Document(page_content=d["page_content"], metadata=d["metadata"]) for d in payload["documents"]]
+
+def put(file_hash: str, loader_path: str, documents: List[Document]):
+    """Store extracted text and per-page metadata, gzip-compressed, written atomically."""
+    path = cache_path(file_hash, loader_path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    payload = {
+        "file_hash": file_hash,
+        "loader": loader_path,
+        "loader_version": loader_version(loader_path),
+        "documents": [
+            # "source" is the temporary path the loader read from; not worth keeping
+            {"page_content": d.page_content, "metadata": {k: v for k, v in d.metadata.items() if k != "source"}}
+            for d in documents
+        ]
+    }
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as raw, gzip.open(raw, "wt", encoding="utf-8", compresslevel=6) as f:
+            json.dump(payload, f, ensure_ascii=False, default=str)
+        os.replace(tmp_path, path)
+    except Exception:
+        os.unlink(tmp_path)
+        raise
+
+def prune(max_bytes: int = None, max_age_days: int = None) -> int:
+    """
+    Remove entries unused for max_age_days, then the least recently used
+    ones until the cache fits in max_bytes (0 disables either limit).
+    Entries of outdated loader versions (and .tmp files of interrupted
+    writes) are never used again and age out.
+    Returns the number of files removed.
+    """
+    max_bytes = settings.parse_cache_max_bytes if max_bytes is None else max_bytes
+    max_age_days = settings.parse_cache_max_age_days if max_age_days is None else max_age_days
+    root = Path(settings.parse_cache_dir)
+    if not root.exists():
+        return 0
+
+    entries = []
+    for path in root.glob("*/*"):
+        try:
+            stat = path.stat()
+        except OSError:
+            continue  # Removed concurrently
+        entries.append((stat.st_mtime, stat.st_size, path))
+    entries.sort()  # Least recently used first
+
+    total = sum(size for _, size, _ in entries)
+    cutoff = time.time() - max_age_days * 86400 if max_age_days else None
+    removed = 0
+    for mtime, size, path in entries:
+        expired = cutoff is not None and mtime < cutoff
+        if not expired and not (max_bytes and total > max_bytes):
+            break
+        try:
+            path.unlink()
+        except OSError:
+            continue
+        total -= size
+        removed += 1
+    if removed:
+        logger.info(f"🧹 Pruned {removed} parse cache entries ({total / 1024 / 1024:.0f} MB left)")
+    return removed
@@ -0,0 +1,133 @@
+from logging.handlers import RotatingFileHandler
+from typing import Any, Dict, List, Optional
+from app.core.config import settings
+from app.core.metrics import QUERY_LOG_RECORDS
+import asyncio
+import json
+import logging
+import os
+import re
+import time
+
+logger = logging.getLogger(__name__)
+
+# Records written per thread hop; the writer takes whatever is queued up to this
+WRITE_BATCH_SIZE = 256
+
+def normalize_question(question: str) -> str:
+    """Lowercased, whitespace-collapsed question, for grouping repeats."""
+    return re.sub(r"\s+", " ", question).strip().lower()
+
+class QueryLog:
+    """
+    Opt-in JSONL log of /api/v1/query traffic for tuning and replay.
+
+    The request path only does a put_nowait() on a bounded queue; a
+    background task writes batches to a size-rotated file off the event
+    loop. When the queue is full records are dropped and counted, so a
+    slow disk never adds latency to queries. Each process writes its own
+    file (queries-<pid>.jsonl) so workers never rotate each other's.
+    """
+
+    def __init__(self, log_dir=None, max_bytes: int = None, backups: int = None, queue_size: int = None):
+        self.log_dir = settings.query_log_dir if log_dir is None else log_dir
+        self.max_bytes = settings.query_log_max_bytes if max_bytes is None else max_bytes
+        self.backups = settings.query_log_backups if backups is None else backups
+        self.queue: asyncio.Queue = asyncio.Queue(
+            maxsize=settings.query_log_queue_size if queue_size is None else queue_size
+        )
+        self._handler: Optional[RotatingFileHandler] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        self.log_dir.mkdir(parents=True, exist_ok=True)
+        self._handler = RotatingFileHandler(
+            self.log_dir / f"queries-{os.getpid()}.jsonl",
+            maxBytes=self.max_bytes,
+            backupCount=self.backups,
+            encoding="utf-8"
+        )
+        self._handler.setFormatter(logging.Formatter("%(message)s"))
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self, timeout: float = 5.0):
+        """Write out what is queued (waiting up to timeout seconds), then close the file."""
+        if self._task:
+            try:
+                await asyncio.wait_for(self.queue.join(), timeout=timeout)
+            except asyncio.TimeoutError:
+                logger.warning(f"Query log shutdown timed out with {self.queue.qsize()} records queued")
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._handler:
+            self._handler.close()
+            self._handler = None
+
+    def record(self, entry: Dict[str, Any]):
+        try:
+            self.queue.put_nowait(entry)
+        except asyncio.QueueFull:
+            QUERY_LOG_RECORDS.labels(outcome="dropped").inc()
+
+    async def _run(self):
+        while True:
+            batch = [await self.queue.get()]
+            while len(batch) < WRITE_BATCH_SIZE and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+            try:
+                await asyncio.to_thread(self._write, batch)
+            except Exception as e:
+                QUERY_LOG_RECORDS.labels(outcome="dropped").inc(len(batch))
+                logger.warning(f"Query log write failed: {e}")
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+
+    def _write(self, batch: List[Dict[str, Any]]):
+        for entry in batch:
+            # RotatingFileHandler rolls the file over before a record that would overflow it
+            self._handler.emit(logging.makeLogRecord({"msg": json.dumps(entry, ensure_ascii=False, default=str)}))
+        self._handler.flush()
+        QUERY_LOG_RECORDS.labels(outcome="written").inc(len(batch))
+
+# Lazy initialization - only created when QUERY_LOG_ENABLED is set
+_query_log: Optional[QueryLog] = None
+
+def start_query_log():
+    global _query_log
+    if settings.query_log_enabled and _query_log is None:
+        _query_log = QueryLog()
+        _query_log.start()
+        logger.info(f"📝 Query log enabled ({_query_log.log_dir})")
+
+async def stop_query_log():
+    global _query_log
+    if _query_log is not None:
+        await _query_log.stop()
+        _query_log = None
+
+def record_query(
+    question: str,
+    params: Dict[str, Any],
+    chunk_ids: List[List[Any]],
+    timings: Dict[str, float],
+    total_seconds: float,
+    status: str
+):
+    """Queue one query for the log; a no-op unless QUERY_LOG_ENABLED is set."""
+    if _query_log is None:
+        return
+    _query_log.record({
+        "ts": time.time() - total_seconds,  # Arrival time, for replay scheduling
+        "question": question,
+        "normalized": normalize_question(question),
+        "params": params,
+        "chunks": chunk_ids,  # [doc_id, chunk_id] in rank order
+        "timings_ms": {stage: round(seconds * 1000, 2) for stage, seconds in timings.items()},
+        "total_ms": round(total_seconds * 1000, 2),
+        "status": status
+    })
@@ -1,33 +1,51 @@
-from langchain_ollama import ChatOllama, OllamaEmbeddings
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, text
+from sqlalchemy.exc import DBAPIError
 from app.models.document import DocumentChunk
 from app.core.config import settings
 from app.schemas.document import SourceChunk
-from typing import List, Tuple
+from app.core.metrics import observe_query_stage, record_query_stage
+from app.services.embeddings import embed_query
+from app.services.embedding_migration import load_active_embedding_model
+from typing import List, Tuple, Optional, Dict, Any
+import functools
 import logging
+import json
+import re
 import time
 
+# SQLSTATE pgvector raises for a query vector of the wrong width
+DATA_EXCEPTION = "22000"
+
 logger = logging.getLogger(__name__)
 
 # Lazy initialization for models (singleton pattern)
-_embeddings_model = None
 _chat_model = None
 
-def get_embeddings_model():
-    """Get or create embeddings model (singleton)."""
-    global _embeddings_model
-    if _embeddings_model is None:
-        _embeddings_model = OllamaEmbeddings(
-            model=settings.embedding_model,
-            base_url=settings.ollama_base_url
-        )
-    return _embeddings_model
+# pgvector version installed in the database, read on the first query
+_vector_version: Optional[Tuple[int, ...]] = None
+
+async def supports_iterative_scan(db: AsyncSession) -> bool:
+    """
+    True if the database's pgvector has ivfflat.iterative_scan (0.8+).
+    On 0.5-0.7 the ivfflat prefix is reserved and setting an unknown
+    parameter under it is an error, so the GUC must not be set there.
+    """
+    global _vector_version
+    if _vector_version is None:
+        version = (await db.execute(
+            text("SELECT extversion FROM pg_extension WHERE extname = 'vector'")
+        )).scalar()
+        _vector_version = tuple(int(part) for part in re.findall(r"\d+", version or "0"))
+        if settings.iterative_index_scan and _vector_version < (0, 8):
+            logger.info(f"pgvector {version} has no iterative index scans; ITERATIVE_INDEX_SCAN is ignored")
+    return _vector_version >= (0, 8)
 
 def get_chat_model():
     """Get or create chat model (singleton)."""
     global _chat_model
     if _chat_model is None:
+        from langchain_ollama import ChatOllama
         _chat_model = ChatOllama(
             model=settings.chat_model,
             base_url=settings.ollama_base_url,
@@ -41,42 +59,163 @@ def get_chat_model():
 async def retrieve_chunks(
     db: AsyncSession,
     question: str,
-    top_k: int = 10  # Increased for better accuracy
+    top_k: int = 10,  # Increased for better accuracy
+    doc_ids: Optional[List[str]] = None,
+    metadata_filter: Optional[Dict[str, Any]] = None,
+    similarity_threshold: Optional[float] = None,
+    retrieval_mode: Optional[str] = None,
+    vector_weight: Optional[float] = None,
+    text_weight: Optional[float] = None
 ) -> List[Tuple[DocumentChunk, float]]:
     """
     Retrieve most similar chunks using pgvector cosine similarity.
+    The doc_id/metadata filters and the similarity threshold are pushed into
+    SQL so only qualifying rows come back from the index scan.
+    In "hybrid" mode a full-text search runs in the same statement and both
+    rankings are fused with weighted Reciprocal Rank Fusion.
     Returns list of (chunk, similarity_score) tuples.
     """
-    start_time = time.time()
-    # Create embedding for the question
-    embeddings_model = get_embeddings_model()
-    question_embedding = await embeddings_model.aembed_query(question)
-    embedding_time = time.time() - start_time
-    logger.debug(f"Embedding: {embedding_time:.2f}s")  # Use debug level
+    search = functools.partial(
+        _retrieve_chunks, db, question, top_k, doc_ids, metadata_filter,
+        similarity_threshold, retrieval_mode, vector_weight, text_weight
+    )
+    # The model the index was built from (an online re-embedding only
+    # switches it at cutover). Read per query rather than from the
+    # per-process cache, so a cutover made by the leader applies in every
+    # worker at once, and a lagging replica answers with the model its own
+    # vectors were made with
+    active = await load_active_embedding_model(db)
+    try:
+        return await search(active[0])
+    except DBAPIError as e:
+        # A cutover committed between reading the active model and the
+        # search, changing the stored vectors' width: embed again
+        if getattr(e.orig, "sqlstate", None) != DATA_EXCEPTION:
+            raise
+        await db.rollback()
+        current = await load_active_embedding_model(db)
+        if current == active:
+            raise
+        logger.warning(f"Embedding model changed during the query, retrying with {current[0]}")
+        return await search(current[0])
+
+async def _retrieve_chunks(
+    db: AsyncSession,
+    question: str,
+    top_k: int,
+    doc_ids: Optional[List[str]],
+    metadata_filter: Optional[Dict[str, Any]],
+    similarity_threshold: Optional[float],
+    retrieval_mode: Optional[str],
+    vector_weight: Optional[float],
+    text_weight: Optional[float],
+    model: str
+) -> List[Tuple[DocumentChunk, float]]:
+    if similarity_threshold is None:
+        similarity_threshold = settings.similarity_threshold
+    if retrieval_mode is None:
+        retrieval_mode = settings.retrieval_mode
+
+    # Create embedding for the question, with the active model
+    with observe_query_stage("embed"):
+        # float32 array, sent to Postgres as a binary vector parameter
+        question_embedding = await embed_query(question, model=model)
 
-    # Convert embedding list to pgvector format string
-    embedding_str = str(question_embedding)
+    # Scope filters shared by the vector and full-text searches
+    filters = []
+    params = {
+        "query_embedding": question_embedding,
+        "max_distance": 1 - similarity_threshold,
+        "top_k": top_k
+    }
+    if doc_ids:
+        filters.append("doc_id = ANY(CAST(:doc_ids AS varchar[]))")
+        params["doc_ids"] = doc_ids
+    if metadata_filter:
+        filters.append("chunk_metadata @> CAST(:metadata_filter AS jsonb)")
+        params["metadata_filter"] = json.dumps(metadata_filter)
+
+    vector_where = " AND ".join([
+        "embedding IS NOT NULL",
+        "embedding <=> CAST(:query_embedding AS vector) <= :max_distance",
+        *filters
+    ])
 
     # Query using pgvector cosine similarity
-    search_start = time.time()
-    query = text("""
-        SELECT
-            id, doc_id, chunk_id, content, chunk_metadata,
-            1 - (embedding <=> CAST(:query_embedding AS vector)) as similarity
-        FROM document_chunks
-        WHERE embedding IS NOT NULL
-        ORDER BY embedding <=> CAST(:query_embedding AS vector)
-        LIMIT :top_k
-    """)
-
-    result = await db.execute(
-        query,
-        {"query_embedding": embedding_str, "top_k": top_k}
-    )
+    if settings.iterative_index_scan and await supports_iterative_scan(db):
+        # Keep probing ivfflat lists until the filtered scan fills LIMIT,
+        # instead of returning fewer than top_k rows (transaction-local)
+        await db.execute(text("SELECT set_config('ivfflat.iterative_scan', 'relaxed_order', true)"))
+
+    if retrieval_mode == "hybrid":
+        # Full-text and vector searches ranked separately, then fused with
+        # Reciprocal Rank Fusion: score = sum(weight / (rrf_k + rank)).
+        # The similarity threshold only applies to the vector side so exact
+        # lexical matches (course codes, titles) still get through.
+        lexical_where = " AND ".join(["content_tsv @@ ts_query", *filters])
+        params.update({
+            "question": question,
+            "candidates": max(top_k, settings.hybrid_candidates),
+            "vector_weight": settings.hybrid_vector_weight if vector_weight is None else vector_weight,
+            "text_weight": settings.hybrid_text_weight if text_weight is None else text_weight,
+            "rrf_k": settings.hybrid_rrf_k
+        })
+        query = text(f"""
+            WITH semantic AS MATERIALIZED (
+                SELECT id, embedding <=> CAST(:query_embedding AS vector) as distance
+                FROM document_chunks
+                WHERE {vector_where}
+                ORDER BY distance
+                LIMIT :candidates
+            ),
+            semantic_ranked AS (
+                SELECT id, ROW_NUMBER() OVER (ORDER BY distance) as rank
+                FROM semantic
+            ),
+            lexical AS (
+                SELECT id, ROW_NUMBER() OVER (ORDER BY ts_rank_cd(content_tsv, ts_query) DESC) as rank
+                FROM document_chunks, websearch_to_tsquery('english', :question) ts_query
+                WHERE {lexical_where}
+                ORDER BY rank
+                LIMIT :candidates
+            ),
+            fused AS (
+                SELECT
+                    COALESCE(s.id, l.id) as id,
+                    COALESCE(CAST(:vector_weight AS float8) / (CAST(:rrf_k AS float8) + s.rank), 0)
+                    + COALESCE(CAST(:text_weight AS float8) / (CAST(:rrf_k AS float8) + l.rank), 0) as score
+                FROM semantic_ranked s
+                FULL OUTER JOIN lexical l ON s.id = l.id
+            )
+            SELECT
+                c.id, c.doc_id, c.chunk_id, c.content, c.chunk_metadata,
+                COALESCE(1 - (c.embedding <=> CAST(:query_embedding AS vector)), 0) as similarity
+            FROM fused
+            JOIN document_chunks c ON c.id = fused.id
+            ORDER BY fused.score DESC
+            LIMIT :top_k
+        """)
+    else:
+        # relaxed_order may return rows slightly out of order, so the
+        # materialized CTE is re-sorted by distance in the outer query
+        query = text(f"""
+            WITH candidates AS MATERIALIZED (
+                SELECT
+                    id, doc_id, chunk_id, content, chunk_metadata,
+                    embedding <=> CAST(:query_embedding AS vector) as distance
+                FROM document_chunks
+                WHERE {vector_where}
+                ORDER BY distance
+                LIMIT :top_k
+            )
+            SELECT id, doc_id, chunk_id, content, chunk_metadata, 1 - distance as similarity
+            FROM candidates
+            ORDER BY distance
+        """)
 
-    rows = result.fetchall()
-    search_time = time.time() - search_start
-    logger.debug(f"Search: {search_time:.2f}s")  # Use debug level
+    with observe_query_stage("search"):
+        result = await db.execute(query, params)
+        rows = result.fetchall()
 
     # Build chunks more efficiently
     chunks_with_similarity = [
@@ -98,7 +237,13 @@ async def retrieve_chunks(
 async def answer_question(
     db: AsyncSession,
     question: str,
-    top_k: int = 10  # Increased for better accuracy
+    top_k: int = 10,  # Increased for better accuracy
+    doc_ids: Optional[List[str]] = None,
+    metadata_filter: Optional[Dict[str, Any]] = None,
+    similarity_threshold: Optional[float] = None,
+    retrieval_mode: Optional[str] = None,
+    vector_weight: Optional[float] = None,
+    text_weight: Optional[float] = None
 ) -> Tuple[str, List[SourceChunk]]:
     """
     Answer a question using RAG:
@@ -108,51 +253,63 @@ async def answer_question(
 
     Returns (answer, sources)
     """
-    total_start = time.time()
+    total_start = time.perf_counter()
     # Retrieve relevant chunks
-    logger.info(f"Query: '{question[:50]}{'...' if len(question) > 50 else ''}' (top_k={top_k})")
-    chunks_with_sim = await retrieve_chunks(db, question, top_k)
-
-    if not chunks_with_sim:
-        return "I don't have enough information to answer this question.", []
-
-    # Filter chunks by similarity threshold (more inclusive for accuracy)
-    similarity_threshold = 0.25  # Lower threshold for better recall
-    relevant_chunks = [(chunk, sim) for chunk, sim in chunks_with_sim if sim >= similarity_threshold]
+    logger.info(f"Query: '{question[:50]}{'...' if len(question) > 50 else ''}' (top_k={top_k}, mode={retrieval_mode or settings.retrieval_mode})")
+    # Similarity threshold is applied in SQL, so every returned chunk is relevant
+    relevant_chunks = await retrieve_chunks(
+        db,
+        question,
+        top_k,
+        doc_ids=doc_ids,
+        metadata_filter=metadata_filter,
+        similarity_threshold=similarity_threshold,
+        retrieval_mode=retrieval_mode,
+        vector_weight=vector_weight,
+        text_weight=text_weight
+    )
 
     if not relevant_chunks:
         return "I don't have enough information to answer this question.", []
 
-    logger.info(f"Using {len(relevant_chunks)} chunks with similarity >= {similarity_threshold}")    # Build context from chunks
-    context_parts = []
-    sources = []
+    logger.info(f"Using {len(relevant_chunks)} chunks")
+    # Build context from chunks
+    with observe_query_stage("context"):
+        context_parts = []
+        sources = []
 
-    for idx, (chunk, similarity) in enumerate(relevant_chunks, 1):
-        context_parts.append(f"[{idx}] {chunk.content}")
-        sources.append(SourceChunk(
-            doc_id=chunk.doc_id,
-            chunk_id=chunk.chunk_id,
-            content=chunk.content[:200] + "..." if len(chunk.content) > 200 else chunk.content,
-            similarity=float(similarity)
-        ))
+        for idx, (chunk, similarity) in enumerate(relevant_chunks, 1):
+            context_parts.append(f"[{idx}] {chunk.content}")
+            sources.append(SourceChunk(
+                doc_id=chunk.doc_id,
+                chunk_id=chunk.chunk_id,
+                content=chunk.content[:200] + "..." if len(chunk.content) > 200 else chunk.content,
+                similarity=float(similarity)
+            ))
 
-    context = "\n\n".join(context_parts)
+        context = "\n\n".join(context_parts)
 
-    # Generate answer with Ollama
-    prompt = f"""Context:
+        # Generate answer with Ollama
+        prompt = f"""Context:
 {context}
 
 Question: {question}
 
 Provide a concise, direct answer (2-3 sentences) using ONLY the context information. Be specific and accurate."""
 
-    llm_start = time.time()
+    # Stream the response so time-to-first-token can be measured
     chat_model = get_chat_model()
-    response = await chat_model.ainvoke(prompt)
-    llm_time = time.time() - llm_start
+    answer_parts = []
+    with observe_query_stage("generation"):
+        llm_start = time.perf_counter()
+        async for chunk in chat_model.astream(prompt):
+            if not answer_parts:
+                record_query_stage("first_token", time.perf_counter() - llm_start)
+            answer_parts.append(chunk.content)
+        llm_time = time.perf_counter() - llm_start
 
-    answer = response.content
-    total_time = time.time() - total_start
+    answer = "".join(answer_parts)
+    total_time = time.perf_counter() - total_start
 
     logger.info(f"RAG complete: {total_time:.2f}s (LLM: {llm_time:.2f}s, {len(relevant_chunks)} chunks used)")
 
@@ -0,0 +1,210 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, delete, func, text
+from pgvector.utils import Vector
+from pathlib import Path
+from typing import Iterator
+from app.core.config import settings
+from app.core.leader import check_leadership
+from app.models.document import DocumentChunk, CatalogDocument
+from app.services.embedding_migration import load_active_embedding_model
+from app.services.ingestion import copy_chunk_records, catalog_upsert
+import numpy as np
+import datetime
+import hashlib
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Bump when the file layout changes; imports refuse other versions
+SNAPSHOT_FORMAT_VERSION = 1
+
+MANIFEST_FILE = "manifest.json"
+EMBEDDINGS_FILE = "embeddings.npy"  # (chunks, dimensions) float32, row i <-> line i of chunks.jsonl
+CHUNKS_FILE = "chunks.jsonl"
+DOCUMENTS_FILE = "documents.jsonl"
+
+EXPORT_BATCH_SIZE = 1000
+
+def _file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def read_manifest(snapshot_dir: Path) -> dict:
+    manifest = json.loads((Path(snapshot_dir) / MANIFEST_FILE).read_text())
+    if manifest.get("format_version") != SNAPSHOT_FORMAT_VERSION:
+        raise ValueError(
+            f"Unsupported snapshot format {manifest.get('format_version')} "
+            f"(expected {SNAPSHOT_FORMAT_VERSION})"
+        )
+    return manifest
+
+async def export_snapshot(db: AsyncSession, snapshot_dir: Path) -> dict:
+    """
+    Write document_chunks and the document catalog to snapshot_dir:
+    embeddings as one float32 .npy matrix, text and metadata as JSONL
+    sidecars, and a manifest recording the embedding model and chunker
+    settings. Rows are streamed, and the matrix is written through a
+    memory map, so memory stays flat however large the index is.
+    The manifest is written last; a directory without one is incomplete.
+    """
+    snapshot_dir = Path(snapshot_dir)
+    snapshot_dir.mkdir(parents=True, exist_ok=True)
+    (snapshot_dir / MANIFEST_FILE).unlink(missing_ok=True)
+
+    # One consistent view of chunks and catalog while ingestion carries on
+    await db.execute(text("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ"))
+    model, dimensions = await load_active_embedding_model(db)
+    chunk_count = (await db.execute(select(func.count()).select_from(DocumentChunk))).scalar()
+
+    embeddings = np.lib.format.open_memmap(
+        snapshot_dir / EMBEDDINGS_FILE, mode="w+", dtype=np.float32, shape=(chunk_count, dimensions)
+    )
+    row = 0
+    with open(snapshot_dir / CHUNKS_FILE, "w", encoding="utf-8") as chunks_file:
+        result = await db.stream(
+            text("""
+                SELECT doc_id, chunk_id, content, chunk_metadata, embedding
+                FROM document_chunks
+                ORDER BY id
+            """).execution_options(yield_per=EXPORT_BATCH_SIZE)
+        )
+        async for batch in result.partitions():
+            for doc_id, chunk_id, content, chunk_metadata, embedding in batch:
+                record = {"doc_id": doc_id, "chunk_id": chunk_id, "content": content, "metadata": chunk_metadata}
+                if embedding is None:
+                    record["embedding"] = None  # Row stays zero; imported as NULL
+                else:
+                    # The binary codec decodes vectors to float32 arrays
+                    embeddings[row] = np.asarray(
+                        embedding.to_numpy() if isinstance(embedding, Vector) else embedding, dtype=np.float32
+                    )
+                chunks_file.write(json.dumps(record, ensure_ascii=False) + "\n")
+                row += 1
+    embeddings.flush()
+    del embeddings
+    if row != chunk_count:
+        raise RuntimeError(f"Exported {row} chunks but counted {chunk_count}")
+
+    documents = (await db.execute(select(CatalogDocument).order_by(CatalogDocument.doc_id))).scalars().all()
+    with open(snapshot_dir / DOCUMENTS_FILE, "w", encoding="utf-8") as documents_file:
+        for doc in documents:
+            documents_file.write(json.dumps({
+                "doc_id": doc.doc_id,
+                "filename": doc.filename,
+                "chunk_count": doc.chunk_count,
+                "size_bytes": doc.size_bytes,
+                "file_hash": doc.file_hash
+            }, ensure_ascii=False) + "\n")
+    await db.rollback()  # Read-only; end the snapshot transaction
+
+    manifest = {
+        "format_version": SNAPSHOT_FORMAT_VERSION,
+        "created_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "embedding_model": model,
+        "embedding_dimensions": dimensions,
+        "chunk_size": settings.chunk_size,
+        "chunk_overlap": settings.chunk_overlap,
+        "chunks": chunk_count,
+        "documents": len(documents),
+        "sha256": {
+            name: _file_sha256(snapshot_dir / name)
+            for name in (EMBEDDINGS_FILE, CHUNKS_FILE, DOCUMENTS_FILE)
+        }
+    }
+    (snapshot_dir / MANIFEST_FILE).write_text(json.dumps(manifest, indent=2))
+    logger.info(f"📦 Exported {chunk_count} chunks from {len(documents)} documents to {snapshot_dir}")
+    return manifest
+
+def _chunk_records(snapshot_dir: Path, embeddings: np.ndarray) -> Iterator[tuple]:
+    with open(snapshot_dir / CHUNKS_FILE, encoding="utf-8") as chunks_file:
+        for row, line in enumerate(chunks_file):
+            record = json.loads(line)
+            embedding = None if "embedding" in record else embeddings[row]
+            yield (
+                record["doc_id"],
+                record["chunk_id"],
+                record["content"],
+                embedding,
+                json.dumps(record["metadata"]) if record["metadata"] is not None else None
+            )
+
+async def import_snapshot(db: AsyncSession, snapshot_dir: Path, replace: bool = False) -> dict:
+    """
+    Bulk load a snapshot into Postgres with binary COPY, reading embeddings
+    through a memory map. Documents in the snapshot replace their existing
+    chunks; with replace=True everything else is dropped too. The snapshot
+    must have been made with the active embedding model, otherwise its
+    vectors would not be comparable to query embeddings.
+    """
+    snapshot_dir = Path(snapshot_dir)
+    manifest = read_manifest(snapshot_dir)
+
+    model, dimensions = await load_active_embedding_model(db)
+    if (manifest["embedding_model"], manifest["embedding_dimensions"]) != (model, dimensions):
+        raise ValueError(
+            f"Snapshot embeddings are {manifest['embedding_model']} ({manifest['embedding_dimensions']} dims), "
+            f"but the active model is {model} ({dimensions} dims)"
+        )
+    if (manifest["chunk_size"], manifest["chunk_overlap"]) != (settings.chunk_size, settings.chunk_overlap):
+        logger.warning(
+            f"Snapshot was chunked with size={manifest['chunk_size']}, overlap={manifest['chunk_overlap']}; "
+            f"new ingests use size={settings.chunk_size}, overlap={settings.chunk_overlap}"
+        )
+
+    for name, expected in manifest["sha256"].items():
+        if _file_sha256(snapshot_dir / name) != expected:
+            raise ValueError(f"Snapshot file {name} is corrupt (checksum mismatch)")
+
+    embeddings = np.load(snapshot_dir / EMBEDDINGS_FILE, mmap_mode="r")
+    if embeddings.shape != (manifest["chunks"], dimensions):
+        raise ValueError(f"Snapshot embeddings have shape {embeddings.shape}, manifest says {manifest['chunks']} chunks")
+
+    with open(snapshot_dir / DOCUMENTS_FILE, encoding="utf-8") as documents_file:
+        documents = [json.loads(line) for line in documents_file]
+    doc_ids = [doc["doc_id"] for doc in documents]
+
+    was_empty = replace or (await db.execute(select(func.count()).select_from(DocumentChunk))).scalar() == 0
+    if replace:
+        await db.execute(text("TRUNCATE TABLE document_chunks, documents"))
+    else:
+        await db.execute(delete(DocumentChunk).where(DocumentChunk.doc_id.in_(doc_ids)))
+
+    await copy_chunk_records(db, _chunk_records(snapshot_dir, embeddings))
+    for doc in documents:
+        await db.execute(catalog_upsert(
+            doc["doc_id"], doc["filename"], doc["chunk_count"], doc["file_hash"], doc["size_bytes"], None,
+            manifest["embedding_model"]
+        ))
+    if was_empty:
+        # ivfflat picks its list centroids at build time; an index built on
+        # an empty table would cluster nothing, so rebuild it on the new data
+        await db.execute(text("REINDEX INDEX embedding_idx"))
+    await check_leadership(db)
+    await db.commit()
+    del embeddings
+
+    logger.info(f"📦 Imported {manifest['chunks']} chunks from {len(documents)} documents ({snapshot_dir})")
+    return manifest
+
+async def bootstrap_from_snapshot(db: AsyncSession) -> bool:
+    """Import BOOTSTRAP_SNAPSHOT if set and the index is empty. Returns True if imported."""
+    if not settings.bootstrap_snapshot:
+        return False
+    if (await db.execute(select(func.count()).select_from(CatalogDocument))).scalar():
+        return False
+    if not (Path(settings.bootstrap_snapshot) / MANIFEST_FILE).exists():
+        logger.warning(f"Bootstrap snapshot {settings.bootstrap_snapshot} not found or incomplete")
+        return False
+    try:
+        await import_snapshot(db, settings.bootstrap_snapshot)
+    except (ValueError, KeyError, OSError):
+        # Incompatible, malformed (JSONDecodeError is a ValueError) or
+        # unreadable: fall back to ingesting the source files
+        await db.rollback()
+        logger.exception(f"Bootstrap snapshot {settings.bootstrap_snapshot} could not be imported")
+        return False
+    return True
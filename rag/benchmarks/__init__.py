@@ -0,0 +1,7 @@
+"""
+Offline benchmarks for the RAG service.
+
+Everything here runs without a live Ollama: a stub HTTP server stands in
+for the embedding/chat API, and ingestion runs against a throwaway
+database on a local Postgres with pgvector.
+"""
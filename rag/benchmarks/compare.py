@@ -0,0 +1,54 @@
+"""
+Compare two benchmark result files and flag regressions.
+
+    python -m benchmarks.compare benchmarks/results/old.json benchmarks/results/new.json
+
+Metrics ending in "_per_s" are higher-is-better; everything else
+(seconds, latencies, memory) is lower-is-better. Exits with status 1 if
+any metric regresses by more than --threshold percent.
+"""
+from benchmarks.results import load_results
+import argparse
+import sys
+
+def is_higher_better(metric: str) -> bool:
+    return metric.endswith("_per_s")
+
+def compare(old: dict, new: dict, threshold: float) -> int:
+    if old.get("config") != new.get("config"):
+        print("⚠ Benchmark configs differ; deltas may not be like-for-like")
+
+    old_results = {r["key"]: r["metrics"] for r in old["results"]}
+    regressions = 0
+    print(f"{'key':<40} {'metric':<20} {old['commit']:>12} {new['commit']:>12} {'change':>9}")
+    for result in new["results"]:
+        baseline = old_results.get(result["key"])
+        if baseline is None:
+            continue
+        for metric, value in result["metrics"].items():
+            before = baseline.get(metric)
+            if not isinstance(value, (int, float)) or not before:
+                continue
+            change = (value - before) / before * 100
+            worse = -change if is_higher_better(metric) else change
+            flag = ""
+            if worse > threshold:
+                flag = " ✗"
+                regressions += 1
+            print(f"{result['key']:<40} {metric:<20} {before:>12.4g} {value:>12.4g} {change:>+8.1f}%{flag}")
+
+    print(f"\n{regressions} regression(s) above {threshold:.0f}%")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files")
+    parser.add_argument("old")
+    parser.add_argument("new")
+    parser.add_argument("--threshold", type=float, default=10.0, help="Regression threshold in percent")
+    args = parser.parse_args()
+
+    regressions = compare(load_results(args.old), load_results(args.new), args.threshold)
+    sys.exit(1 if regressions else 0)
+
+if __name__ == "__main__":
+    main()
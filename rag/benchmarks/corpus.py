@@ -0,0 +1,167 @@
+"""Synthetic corpora (PDF, DOCX, MD, CSV) for ingestion benchmarks."""
+from pathlib import Path
+from typing import Dict, List
+import csv
+import io
+import random
+import zipfile
+
+# Approximate characters of text per size preset
+CORPUS_SIZES: Dict[str, int] = {
+    "small": 20_000,
+    "medium": 200_000,
+    "large": 2_000_000,
+}
+
+CORPUS_FORMATS = ["pdf", "docx", "md", "csv"]
+
+_SUBJECTS = ["Data Structures", "Algorithms", "Discrete Mathematics", "Operating Systems",
+             "Database Systems", "Computer Networks", "Software Engineering", "Web Development",
+             "Information Management", "Systems Analysis", "Human Computer Interaction",
+             "Automata Theory", "Computer Architecture", "Information Assurance", "Capstone Project"]
+_PREFIXES = ["CSC", "IT", "IS", "CA", "MAT", "STT"]
+_WORDS = ("the student will study design analysis implementation of programs systems data "
+          "structures networks security databases theory practice laboratory lecture units "
+          "prerequisite semester year program curriculum requirements elective major core "
+          "project research methods applications software hardware information technology").split()
+
+def _course(rng: random.Random) -> Dict[str, str]:
+    return {
+        "code": f"{rng.choice(_PREFIXES)} {rng.randint(100, 199)}",
+        "title": rng.choice(_SUBJECTS),
+        "units": str(rng.choice([2, 3, 3, 3, 4])),
+        "description": " ".join(rng.choice(_WORDS) for _ in range(rng.randint(20, 40))).capitalize() + ".",
+    }
+
+def _paragraphs(rng: random.Random, target_chars: int) -> List[str]:
+    paragraphs, total = [], 0
+    while total < target_chars:
+        course = _course(rng)
+        paragraph = f"{course['code']} {course['title']} ({course['units']} units). {course['description']}"
+        paragraphs.append(paragraph)
+        total += len(paragraph) + 2
+    return paragraphs
+
+def _pdf_escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+def _wrap(paragraphs: List[str], width: int = 90) -> List[str]:
+    lines = []
+    for paragraph in paragraphs:
+        line = ""
+        for word in paragraph.split():
+            if len(line) + len(word) + 1 > width:
+                lines.append(line)
+                line = word
+            else:
+                line = f"{line} {word}" if line else word
+        lines.extend([line, ""])
+    return lines
+
+def build_pdf(paragraphs: List[str]) -> bytes:
+    """Minimal multi-page PDF with Helvetica text that pypdf can extract."""
+    lines = _wrap(paragraphs)
+    lines_per_page = 60
+    pages = [lines[i:i + lines_per_page] for i in range(0, len(lines), lines_per_page)]
+
+    # Object numbers: 1 catalog, 2 page tree, 3 font, then (page, content) pairs
+    objects: List[bytes] = []
+    page_refs = " ".join(f"{4 + i * 2} 0 R" for i in range(len(pages)))
+    objects.append(b"<< /Type /Catalog /Pages 2 0 R >>")
+    objects.append(f"<< /Type /Pages /Kids [{page_refs}] /Count {len(pages)} >>".encode())
+    objects.append(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    for i, page_lines in enumerate(pages):
+        content_ref = 5 + i * 2
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {content_ref} 0 R >>".encode()
+        )
+        body = "BT /F1 10 Tf 12 TL 50 760 Td\n"
+        body += "\n".join(f"({_pdf_escape(line)}) Tj T*" for line in page_lines)
+        body += "\nET"
+        stream = body.encode("latin-1", "replace")
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+
+    out = io.BytesIO()
+    out.write(b"%PDF-1.4\n")
+    offsets = []
+    for number, obj in enumerate(objects, 1):
+        offsets.append(out.tell())
+        out.write(b"%d 0 obj\n" % number + obj + b"\nendobj\n")
+    xref_offset = out.tell()
+    out.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+    for offset in offsets:
+        out.write(b"%010d 00000 n \n" % offset)
+    out.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref_offset))
+    return out.getvalue()
+
+def build_docx(paragraphs: List[str]) -> bytes:
+    """Minimal WordprocessingML package readable by docx2txt."""
+    def xml_escape(text: str) -> str:
+        return text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+
+    body = "".join(f"<w:p><w:r><w:t>{xml_escape(p)}</w:t></w:r></w:p>" for p in paragraphs)
+    document = (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
+        f"<w:body>{body}</w:body></w:document>"
+    )
+    content_types = (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/word/document.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>'
+        "</Types>"
+    )
+    rels = (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+        'Target="word/document.xml"/></Relationships>'
+    )
+    out = io.BytesIO()
+    with zipfile.ZipFile(out, "w", zipfile.ZIP_DEFLATED) as docx:
+        docx.writestr("[Content_Types].xml", content_types)
+        docx.writestr("_rels/.rels", rels)
+        docx.writestr("word/document.xml", document)
+    return out.getvalue()
+
+def build_markdown(paragraphs: List[str]) -> bytes:
+    parts = []
+    for i, paragraph in enumerate(paragraphs):
+        if i % 10 == 0:
+            parts.append(f"## Year {i // 40 + 1}, Semester {(i // 10) % 4 + 1}")
+        parts.append(paragraph)
+    return "\n\n".join(parts).encode()
+
+def build_csv(rng: random.Random, target_chars: int) -> bytes:
+    out = io.StringIO()
+    writer = csv.DictWriter(out, fieldnames=["code", "title", "units", "description"])
+    writer.writeheader()
+    while out.tell() < target_chars:
+        writer.writerow(_course(rng))
+    return out.getvalue().encode()
+
+def build_file(fmt: str, size: str, seed: int = 0) -> bytes:
+    """Build one synthetic file; the same (fmt, size, seed) always yields the same bytes."""
+    rng = random.Random(f"{fmt}-{size}-{seed}")
+    target_chars = CORPUS_SIZES[size]
+    if fmt == "csv":
+        return build_csv(rng, target_chars)
+    paragraphs = _paragraphs(rng, target_chars)
+    builders = {"pdf": build_pdf, "docx": build_docx, "md": build_markdown}
+    return builders[fmt](paragraphs)
+
+def generate_corpus(out_dir: Path, formats: List[str], sizes: List[str], seed: int = 0) -> List[Path]:
+    """Write synthetic files named <size>-corpus.<fmt> into out_dir."""
+    out_dir.mkdir(parents=True, exist_ok=True)
+    paths = []
+    for size in sizes:
+        for fmt in formats:
+            path = out_dir / f"{size}-corpus.{fmt}"
+            path.write_bytes(build_file(fmt, size, seed))
+            paths.append(path)
+    return paths
@@ -0,0 +1,32 @@
+"""Throwaway Postgres databases for benchmarks."""
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+from sqlalchemy.engine import make_url
+import asyncpg
+import uuid
+
+@asynccontextmanager
+async def throwaway_database(server_url: str) -> AsyncIterator[str]:
+    """
+    Create a uniquely named database on the server in server_url (any
+    SQLAlchemy URL, e.g. the docker-compose pgvector instance), yield its
+    SQLAlchemy URL and drop it afterwards.
+    """
+    url = make_url(server_url)
+    name = f"rag_bench_{uuid.uuid4().hex[:8]}"
+    admin_dsn = url.set(drivername="postgresql", database="postgres").render_as_string(hide_password=False)
+
+    conn = await asyncpg.connect(admin_dsn)
+    try:
+        await conn.execute(f'CREATE DATABASE "{name}"')
+    finally:
+        await conn.close()
+
+    try:
+        yield url.set(database=name).render_as_string(hide_password=False)
+    finally:
+        conn = await asyncpg.connect(admin_dsn)
+        try:
+            await conn.execute(f'DROP DATABASE IF EXISTS "{name}" WITH (FORCE)')
+        finally:
+            await conn.close()
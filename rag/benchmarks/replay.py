@@ -0,0 +1,179 @@
+"""
+Replay a captured query log (QUERY_LOG_ENABLED=true) against the service
+or against the retrieval layer only.
+
+Requests are sent at their recorded arrival times, compressed by --speed
+(2 = twice as fast; 0 = back to back, bounded by --max-in-flight). Besides
+latency, each replayed query's retrieved chunks are compared with the ones
+logged, so index, threshold or top_k changes can be judged on real traffic.
+
+Against a running service:
+    python -m benchmarks.replay data/logs/queries --url http://localhost:8001 --speed 1
+
+Retrieval only (no LLM), using DATABASE_URL and OLLAMA_BASE_URL:
+    python -m benchmarks.replay data/logs/queries --retrieval-only --speed 0
+"""
+from benchmarks.query_load import parse_server_timing
+from benchmarks.results import RESULTS_DIR, latency_summary, write_results
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+import argparse
+import asyncio
+import json
+import time
+import httpx
+
+def load_log(paths: List[Path]) -> List[Dict[str, Any]]:
+    """Read query log files (or directories of them, rotated files included) in arrival order."""
+    files = []
+    for path in paths:
+        files.extend(sorted(path.glob("queries-*.jsonl*")) if path.is_dir() else [path])
+    entries = []
+    for file in files:
+        for line in file.read_text(encoding="utf-8").splitlines():
+            if line.strip():
+                entries.append(json.loads(line))
+    return sorted(entries, key=lambda entry: entry["ts"])
+
+def chunk_overlap(logged: List[List[Any]], replayed: List[Tuple[str, int]]) -> Optional[float]:
+    """Fraction of the logged chunks retrieved again (None if none were logged)."""
+    if not logged:
+        return None
+    return len({tuple(c) for c in logged} & set(replayed)) / len(logged)
+
+def request_body(entry: Dict[str, Any]) -> Dict[str, Any]:
+    params = {k: v for k, v in entry.get("params", {}).items() if v is not None}
+    return {"question": entry["question"], **params}
+
+class HttpTarget:
+    def __init__(self, base_url: str, timeout: float, max_in_flight: int):
+        limits = httpx.Limits(max_connections=max_in_flight, max_keepalive_connections=max_in_flight)
+        self.client = httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits)
+
+    async def run(self, entry: Dict[str, Any]) -> Tuple[bool, List[Tuple[str, int]], Dict[str, float]]:
+        try:
+            response = await self.client.post("/api/v1/query", json=request_body(entry))
+        except httpx.HTTPError:
+            return False, [], {}
+        if response.status_code != 200:
+            return False, [], {}
+        chunks = [(s["doc_id"], s["chunk_id"]) for s in response.json()["sources"]]
+        return True, chunks, parse_server_timing(response.headers.get("server-timing", ""))
+
+    async def close(self):
+        await self.client.aclose()
+
+class RetrievalTarget:
+    """Calls retrieve_chunks() in-process: embedding and search, no generation."""
+
+    async def run(self, entry: Dict[str, Any]) -> Tuple[bool, List[Tuple[str, int]], Dict[str, float]]:
+        from app.core.db import AsyncSessionLocal
+        from app.core.metrics import start_stage_timings
+        from app.services.rag import retrieve_chunks
+
+        params = request_body(entry)
+        question = params.pop("question")
+        params["top_k"] = params.get("top_k") or 10  # Same default as the endpoint
+        timings = start_stage_timings()
+        try:
+            async with AsyncSessionLocal() as db:
+                results = await retrieve_chunks(db, question, **params)
+        except Exception:
+            return False, [], {}
+        return True, [(chunk.doc_id, chunk.chunk_id) for chunk, _ in results], dict(timings)
+
+    async def close(self):
+        from app.core.db import dispose_engines
+        await dispose_engines()
+
+async def replay(target, entries: List[Dict[str, Any]], speed: float, max_in_flight: int) -> Dict[str, float]:
+    records = []
+    semaphore = asyncio.Semaphore(max_in_flight)
+
+    async def send(entry: Dict[str, Any]):
+        # Timed from the scheduled arrival, so waiting for a slot counts as latency
+        start = time.perf_counter()
+        async with semaphore:
+            ok, chunks, timings = await target.run(entry)
+            records.append({
+                "latency": time.perf_counter() - start,
+                "ok": ok,
+                "overlap": chunk_overlap(entry.get("chunks", []), chunks) if ok else None,
+                **timings
+            })
+
+    tasks = []
+    first_ts = entries[0]["ts"]
+    start = time.perf_counter()
+    for entry in entries:
+        if speed > 0:
+            due = start + (entry["ts"] - first_ts) / speed
+            await asyncio.sleep(max(0.0, due - time.perf_counter()))
+        tasks.append(asyncio.create_task(send(entry)))
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - start
+
+    ok_records = [r for r in records if r["ok"]]
+    overlaps = [r["overlap"] for r in ok_records if r["overlap"] is not None]
+    metrics = {
+        "requests": len(records),
+        "errors": len(records) - len(ok_records),
+        "throughput_per_s": len(ok_records) / elapsed,
+        "mean_chunk_overlap": sum(overlaps) / len(overlaps) if overlaps else 0.0
+    }
+    metrics.update(latency_summary([r["latency"] for r in ok_records], "latency"))
+    for stage in ("embed", "search", "generation", "first_token"):
+        metrics.update(latency_summary([r[stage] for r in ok_records if stage in r], stage))
+    return metrics
+
+async def run(args: argparse.Namespace) -> Path:
+    entries = [e for e in load_log([Path(p) for p in args.logs]) if args.include_errors or e.get("status") == "ok"]
+    if args.limit:
+        entries = entries[:args.limit]
+    if not entries:
+        raise SystemExit("No queries to replay")
+    span = entries[-1]["ts"] - entries[0]["ts"]
+    print(f"Replaying {len(entries)} queries recorded over {span:.0f}s (speed {args.speed:g})")
+
+    target = RetrievalTarget() if args.retrieval_only else HttpTarget(args.url, args.timeout, args.max_in_flight)
+    try:
+        metrics = await replay(target, entries, args.speed, args.max_in_flight)
+    finally:
+        await target.close()
+
+    print(
+        f"{metrics['requests']} requests, {metrics['errors']} errors | "
+        f"p50 {metrics.get('latency_p50_ms', 0):.0f} ms  p95 {metrics.get('latency_p95_ms', 0):.0f} ms  "
+        f"p99 {metrics.get('latency_p99_ms', 0):.0f} ms | chunk overlap {metrics['mean_chunk_overlap']:.2%}"
+    )
+    config = {
+        "target": "retrieval" if args.retrieval_only else args.url,
+        "logs": args.logs,
+        "queries": len(entries),
+        "speed": args.speed
+    }
+    mode = "retrieval" if args.retrieval_only else "http"
+    return write_results("replay", config, [{"key": f"{mode}/speed={args.speed:g}", "metrics": metrics}],
+                         Path(args.out_dir) if args.out_dir else RESULTS_DIR)
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a captured query log")
+    parser.add_argument("logs", nargs="+", help="Query log files or directories")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--url", help="Base URL of a running service")
+    target.add_argument("--retrieval-only", action="store_true",
+                        help="Call retrieve_chunks() in-process (uses DATABASE_URL / OLLAMA_BASE_URL)")
+    parser.add_argument("--speed", type=float, default=1.0,
+                        help="Time compression of the recorded arrivals; 0 sends back to back")
+    parser.add_argument("--limit", type=int, help="Replay only the first N queries")
+    parser.add_argument("--include-errors", action="store_true", help="Also replay queries that failed originally")
+    parser.add_argument("--max-in-flight", type=int, default=64)
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--out-dir", help="Where to write the results JSON (default benchmarks/results)")
+    args = parser.parse_args()
+
+    path = asyncio.run(run(args))
+    print(f"Results written to {path}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""Benchmark result files: one JSON document per run, comparable across commits."""
+from pathlib import Path
+from typing import Any, Dict, List
+import datetime
+import json
+import platform
+import subprocess
+
+RESULTS_DIR = Path(__file__).parent / "results"
+
+def percentile(values: List[float], pct: float) -> float:
+    """Linear-interpolated percentile (pct in 0-100) of a non-empty list."""
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * pct / 100
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+def latency_summary(values: List[float], prefix: str) -> Dict[str, float]:
+    """p50/p95/p99 in milliseconds for a list of durations in seconds."""
+    if not values:
+        return {}
+    return {f"{prefix}_p{p}_ms": percentile(values, p) * 1000 for p in (50, 95, 99)}
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True, cwd=Path(__file__).parent
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def write_results(kind: str, config: Dict[str, Any], results: List[Dict[str, Any]], out_dir: Path = RESULTS_DIR) -> Path:
+    """
+    Save a run as <kind>-<timestamp>-<commit>.json. Each result is
+    {"key": "...", "metrics": {name: number}}; compare.py matches results
+    across files by key.
+    """
+    commit = git_commit()
+    timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+    out_dir.mkdir(parents=True, exist_ok=True)
+    path = out_dir / f"{kind}-{timestamp}-{commit}.json"
+    path.write_text(json.dumps({
+        "kind": kind,
+        "commit": commit,
+        "created_at": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": config,
+        "results": results
+    }, indent=2))
+    return path
+
+def load_results(path: Path) -> Dict[str, Any]:
+    return json.loads(Path(path).read_text())
@@ -0,0 +1,65 @@
+"""Run the API as a subprocess against a stub Ollama server and a throwaway database."""
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import AsyncIterator, Dict, Optional
+import asyncio
+import os
+import subprocess
+import sys
+import time
+import httpx
+
+RAG_DIR = Path(__file__).parent.parent
+
+@asynccontextmanager
+async def running_service(
+    database_url: str,
+    ollama_url: str,
+    port: int = 8011,
+    env: Optional[Dict[str, str]] = None,
+    ready_timeout: float = 600.0
+) -> AsyncIterator[str]:
+    """
+    Start uvicorn on app.main:app and yield its base URL once startup
+    ingestion of data/source has finished, so queries hit a full index.
+    """
+    service_env = {
+        **os.environ,
+        "DATABASE_URL": database_url,
+        "OLLAMA_BASE_URL": ollama_url,
+        # Stub embeddings are random, so cosine similarities hover around 0
+        "SIMILARITY_THRESHOLD": "0",
+        **(env or {})
+    }
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port)],
+        cwd=RAG_DIR,
+        env=service_env
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        await wait_until_ready(base_url, process, ready_timeout)
+        yield base_url
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+async def wait_until_ready(base_url: str, process: subprocess.Popen, timeout: float):
+    """Wait for /status to report chunks and /metrics to report an empty ingestion queue."""
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(base_url=base_url, timeout=5.0) as client:
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise RuntimeError(f"Service exited during startup (code {process.returncode})")
+            try:
+                status = (await client.get("/status")).json()
+                metrics = (await client.get("/metrics")).text
+                if status.get("total_chunks") and "rag_ingest_queue_depth 0.0" in metrics:
+                    return
+            except (httpx.HTTPError, ValueError):
+                pass
+            await asyncio.sleep(1.0)
+    raise TimeoutError(f"Service at {base_url} not ready after {timeout:.0f}s")
@@ -0,0 +1,202 @@
+"""
+Stub Ollama HTTP server with configurable latency.
+
+Implements the endpoints the service uses (/api/embed, /api/embeddings,
+/api/chat, /api/generate) and returns deterministic fake vectors so
+benchmarks can run without a GPU or model downloads.
+
+Run standalone:
+    python -m benchmarks.stub_ollama --port 11435 --embed-latency-ms 20
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from dataclasses import dataclass
+from typing import List
+import argparse
+import hashlib
+import json
+import threading
+import time
+import numpy as np
+
+@dataclass
+class StubLatency:
+    embed_ms: float = 0.0  # Fixed cost per embed request
+    embed_per_item_ms: float = 0.0  # Added per input text
+    chat_first_token_ms: float = 0.0  # Delay before the first streamed token
+    chat_per_token_ms: float = 0.0  # Delay between streamed tokens
+
+def fake_embedding(text: str, dimensions: int) -> List[float]:
+    """Deterministic unit vector derived from the text."""
+    seed = int.from_bytes(hashlib.sha256(text.encode()).digest()[:8], "little")
+    vector = np.random.default_rng(seed).standard_normal(dimensions).astype(np.float32)
+    vector /= np.linalg.norm(vector)
+    return vector.tolist()
+
+class _Handler(BaseHTTPRequestHandler):
+    server: "StubOllamaServer"
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass  # Keep benchmark output clean
+
+    def _read_json(self) -> dict:
+        length = int(self.headers.get("Content-Length", 0))
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def _send_json(self, payload: dict):
+        body = json.dumps(payload).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _stream(self, lines):
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for line in lines:
+            data = json.dumps(line).encode() + b"\n"
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+            self.wfile.flush()
+        self.wfile.write(b"0\r\n\r\n")
+
+    def do_GET(self):
+        if self.path in ("/", "/api/version"):
+            self._send_json({"version": "stub"})
+        elif self.path == "/api/tags":
+            self._send_json({"models": []})
+        else:
+            self.send_error(404)
+
+    def do_POST(self):
+        payload = self._read_json()
+        latency = self.server.latency
+        dims = self.server.dimensions
+
+        if self.path == "/api/embed":
+            inputs = payload.get("input", [])
+            inputs = [inputs] if isinstance(inputs, str) else inputs
+            time.sleep((latency.embed_ms + latency.embed_per_item_ms * len(inputs)) / 1000)
+            self.server.count("embed", len(inputs))
+            self._send_json({
+                "model": payload.get("model"),
+                "embeddings": [fake_embedding(text, dims) for text in inputs]
+            })
+        elif self.path == "/api/embeddings":
+            time.sleep((latency.embed_ms + latency.embed_per_item_ms) / 1000)
+            self.server.count("embed", 1)
+            self._send_json({"embedding": fake_embedding(payload.get("prompt", ""), dims)})
+        elif self.path in ("/api/chat", "/api/generate"):
+            self.server.count("chat", 1)
+            self._handle_generation(payload, chat=self.path == "/api/chat")
+        else:
+            self.send_error(404)
+
+    def _handle_generation(self, payload: dict, chat: bool):
+        latency = self.server.latency
+        tokens = self.server.answer.split(" ")
+        model = payload.get("model")
+
+        def message(content: str, done: bool) -> dict:
+            line = {"model": model, "created_at": "1970-01-01T00:00:00Z", "done": done}
+            if chat:
+                line["message"] = {"role": "assistant", "content": content}
+            else:
+                line["response"] = content
+            if done:
+                line.update({"done_reason": "stop", "eval_count": len(tokens), "prompt_eval_count": 0})
+            return line
+
+        def generate():
+            time.sleep(latency.chat_first_token_ms / 1000)
+            for i, token in enumerate(tokens):
+                if i:
+                    time.sleep(latency.chat_per_token_ms / 1000)
+                yield message(token if i == 0 else f" {token}", False)
+            yield message("", True)
+
+        if payload.get("stream", True):
+            self._stream(generate())
+        else:
+            lines = list(generate())
+            final = lines[-1]
+            text = "".join(l["message"]["content"] if chat else l["response"] for l in lines)
+            if chat:
+                final["message"]["content"] = text
+            else:
+                final["response"] = text
+            self._send_json(final)
+
+class StubOllamaServer(ThreadingHTTPServer):
+    """Threaded stub server; use as a context manager to run it in the background."""
+    daemon_threads = True
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency: StubLatency = None,
+        dimensions: int = 768,
+        answer: str = "This is a stubbed answer generated for benchmarking purposes only."
+    ):
+        super().__init__((host, port), _Handler)
+        self.latency = latency or StubLatency()
+        self.dimensions = dimensions
+        self.answer = answer
+        self.requests = {"embed": 0, "chat": 0}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def count(self, kind: str, n: int):
+        with self._lock:
+            self.requests[kind] += n
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+        self.server_close()
+
+def add_latency_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--embed-latency-ms", type=float, default=0.0)
+    parser.add_argument("--embed-latency-per-item-ms", type=float, default=0.0)
+    parser.add_argument("--chat-first-token-ms", type=float, default=0.0)
+    parser.add_argument("--chat-per-token-ms", type=float, default=0.0)
+
+def latency_from_args(args: argparse.Namespace) -> StubLatency:
+    return StubLatency(
+        embed_ms=args.embed_latency_ms,
+        embed_per_item_ms=args.embed_latency_per_item_ms,
+        chat_first_token_ms=args.chat_first_token_ms,
+        chat_per_token_ms=args.chat_per_token_ms
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description="Stub Ollama server for benchmarks")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--dimensions", type=int, default=768)
+    add_latency_arguments(parser)
+    args = parser.parse_args()
+
+    server = StubOllamaServer(args.host, args.port, latency_from_args(args), args.dimensions)
+    print(f"Stub Ollama listening on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,45 @@
+from pathlib import Path
+import argparse
+import os
+import tempfile
 import uvicorn
 
 def main():
+    """Development server: single process with auto-reload."""
     uvicorn.run("app.main:app", host="0.0.0.0", port=8001, reload=True)
 
+def serve(workers: int = None, host: str = None, port: int = None):
+    """
+    Production server: multiple workers, no reload. All workers serve
+    queries; the advisory-lock leader among them (and across replicas)
+    runs startup ingestion and the file watcher.
+    Metrics go through prometheus_client's multiprocess mode so /metrics
+    reports all workers, whichever one answers the scrape.
+    """
+    from app.core.config import settings
+    metrics_dir = os.environ.get("PROMETHEUS_MULTIPROC_DIR") or tempfile.mkdtemp(prefix="rag-metrics-")
+    # Samples left by a previous run would be aggregated with the new workers'
+    os.makedirs(metrics_dir, exist_ok=True)
+    for stale in Path(metrics_dir).glob("*.db"):
+        stale.unlink()
+    os.environ["PROMETHEUS_MULTIPROC_DIR"] = metrics_dir
+    uvicorn.run(
+        "app.main:app",
+        host=host or settings.host,
+        port=port or settings.port,
+        workers=workers or settings.workers,
+        proxy_headers=True
+    )
+
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="RAG System API")
+    parser.add_argument("--prod", action="store_true", help="Run multiple workers without reload")
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--host")
+    parser.add_argument("--port", type=int)
+    args = parser.parse_args()
+
+    if args.prod:
+        serve(args.workers, args.host, args.port)
+    else:
+        main()
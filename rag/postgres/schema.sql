@@ -20,3 +20,82 @@ WITH (lists = 100);
 
 -- Create index for doc_id lookups
 CREATE INDEX IF NOT EXISTS doc_id_idx ON document_chunks(doc_id);
+
+
+-- Full-text search column for hybrid retrieval, kept in sync with content by Postgres.
+-- ALTER TABLE takes an ACCESS EXCLUSIVE lock even when the column already
+-- exists (IF NOT EXISTS is checked after locking), so only run it when needed
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM information_schema.columns
+        WHERE table_schema = current_schema()
+          AND table_name = 'document_chunks'
+          AND column_name = 'content_tsv'
+    ) THEN
+        ALTER TABLE document_chunks ADD COLUMN content_tsv tsvector
+            GENERATED ALWAYS AS (to_tsvector('english', content)) STORED;
+    END IF;
+END $$;
+
+CREATE INDEX IF NOT EXISTS content_tsv_idx ON document_chunks
+USING gin (content_tsv);
+
+-- Index for metadata filters (chunk_metadata @> '{"filename": "..."}')
+CREATE INDEX IF NOT EXISTS chunk_metadata_idx ON document_chunks
+USING gin (chunk_metadata jsonb_path_ops);
+
+-- Large doc groups that are queried on their own can get a partial ANN index
+-- so filtered searches only scan that slice, e.g.:
+--
+-- CREATE INDEX IF NOT EXISTS embedding_bsit_idx ON document_chunks
+-- USING ivfflat (embedding vector_cosine_ops) WITH (lists = 20)
+-- WHERE doc_id = 'information-technology-prospectus';
+--
+-- The planner only picks a partial index when the query filter matches its
+-- WHERE clause, so keep the predicate identical to the doc_ids being queried.
+-- retrieve_chunks() passes doc_ids as a bound array parameter, which such a
+-- predicate never matches, so these indexes only serve hand-written queries.
+
+-- Document catalog, updated in the same transaction as a document's chunks
+-- so /status never has to scan document_chunks
+CREATE TABLE IF NOT EXISTS documents (
+    doc_id VARCHAR(255) PRIMARY KEY,
+    filename VARCHAR(512),
+    chunk_count INTEGER NOT NULL DEFAULT 0,
+    size_bytes BIGINT,
+    file_hash CHAR(64),  -- sha256 of the source file
+    ingest_duration_ms INTEGER,
+    embedding_model VARCHAR(255),
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+-- One-off backfill for databases ingested before the catalog existed
+INSERT INTO documents (doc_id, chunk_count)
+SELECT doc_id, COUNT(*) FROM document_chunks
+WHERE NOT EXISTS (SELECT 1 FROM documents)
+GROUP BY doc_id
+ON CONFLICT (doc_id) DO NOTHING;
+
+-- Online re-embedding: the backfill writes embedding_next from content in
+-- batches, then a short cutover swaps it in for embedding. The newest
+-- 'done' row names the active embedding model.
+CREATE TABLE IF NOT EXISTS embedding_migrations (
+    id SERIAL PRIMARY KEY,
+    source_model VARCHAR(255),
+    target_model VARCHAR(255) NOT NULL,
+    target_dimensions INTEGER NOT NULL,
+    status VARCHAR(32) NOT NULL DEFAULT 'pending',  -- pending, backfilling, indexing, done, failed, cancelled
+    last_chunk_id INTEGER NOT NULL DEFAULT 0,
+    processed INTEGER NOT NULL DEFAULT 0,
+    total INTEGER,
+    error TEXT,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    started_at TIMESTAMPTZ,
+    updated_at TIMESTAMPTZ,
+    finished_at TIMESTAMPTZ
+);
+
+-- At most one migration in flight
+CREATE UNIQUE INDEX IF NOT EXISTS embedding_migrations_active_idx ON embedding_migrations ((true))
+WHERE status IN ('pending', 'backfilling', 'indexing');